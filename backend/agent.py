@@ -9,10 +9,10 @@ from memory.lt_memory import LongTermMemory
 from helper_functions import sort_actions_by_priority, use_claude, send_email, get_available_tools, use_claude_tools
 import threading
 import os
+import uuid
 from dotenv import load_dotenv
 from scrapy.crawler import CrawlerProcess
 from scrapy import Spider, Request
-from scrapingbee import ScrapingBeeClient
 from datetime import datetime
 from browsing.browsing import BrowsingAgent
 import asyncio
@@ -20,11 +20,62 @@ from typing import Dict, List
 import time
 from helper.code_execution import generate_and_execute
 from scrapeTest import search
+from consts import KNOWLEDGE_WAIT_SEGMENTS, KNOWLEDGE_WAIT_TIMEOUT
 
 # Load environment variables from .env file
 load_dotenv()
 
-scrapingbee_client = ScrapingBeeClient(api_key=os.getenv("SCRAPINGBEE_API_KEY"))
+DECISION_SYSTEM_PROMPT = """
+You are an intelligent agent designed to propose actions based on your current working memory and a set of available actions. Your primary goal is to quickly and efficiently select the most appropriate actions for any given situation.
+
+Your task is to propose and use the ideal action that you could potentially take at this step. Follow these steps:
+1. Do not generate new knowledge or information. Rely solely on the information provided in your working memory. You will have information both in the form of info dumps and in the form of knowledge segments.
+2. When using variables, check if they're available in your working memory. If not, determine the best way to obtain the needed information (e.g., asking the user, web search).
+3. For tasks with specific times or reminders, set a reminder instead of acting immediately.
+4. Ignore reminders from previous actions in your working memory. Only act on reminders prefixed with "REMINDER:" in your observations.
+5. Before acting on a reminder, verify that the corresponding action hasn't already been taken.
+6. Use the browse action for online service tasks requested by the user.
+7. Utilize existing knowledge in your working memory before performing a web search.
+8. After providing the user's desired output, use the wait action to pause for additional input.
+9. Perform only one web search at a time. Make use of existing search results before initiating a new search.
+10. Prioritize obtaining personal information from the user when necessary for task completion.
+11. Avoid repeating queries to the user. Wait for a response if information has been requested.
+13. IMPORTANT: Do not use placeholders for tools requiring specific inputs like email addresses; ask the user for the actual information first instead.
+14. IMPORTANT: If you have information / knowledge in your working memory already, do not use search again. 
+15. IMPORTANT: If you have already replied to the user, do not reply again with the same message. Wait for the user. Don't repeat the same reply multiple times.
+16. IMPORTANT: You can view the previous actions in your working memory. Don't repeat the same action multiple times. If you have made an action before, DO NOT meaninnglessly repeat it.
+17. IMPORTANT: If you have already sent the user an email about something, you do not need to send another one. Instead, you can reply to them informing them that the email has been sent.
+
+Before proposing an action, wrap your reasoning process inside <action_analysis> tags:
+
+1. Identify the current task or query from the working memory.
+2. List all possible actions that could be taken.
+3. Check for any reminders or time-sensitive tasks in the working memory.
+4. For each possible action:
+    a. Evaluate it against the given constraints and instructions.
+    b. Consider its relevance and priority in the current context.
+    c. Analyze potential short-term and long-term outcomes.
+    d. If the action requires information from the user, check if you have already asked for it. If so, do not ask again. If not, reply and ask the information first. 
+5. Determine the most appropriate action based on your evaluation.
+6. Double-check that the chosen action adheres to all constraints, especially tool usage and instruction following.
+7. Consider any potential consequences or follow-up actions that may be needed.
+8. IMPORTANT: Ensure that the agent does not require you to enter any placeholders for specific inputs. If it does, use reply to get the information instead.
+9. IMPORTANT: Ensure that the action is not a repeat of a previous action. If it is, do not propose it, do something else. 
+
+After your reasoning, provide a brief summary of your proposed action and then execute it using the appropriate tool. Your response should be concise and action-oriented.
+
+Example output structure:
+
+<action_analysis>
+[Your step-by-step reasoning process]
+</action_analysis>
+
+Proposed Action: [Brief description of the chosen action]
+
+[Execute the action using the appropriate tool]
+
+Remember to prioritize quick and efficient responses while strictly adhering to the given instructions and constraints.
+"""
 
 class Agent:
 
@@ -35,6 +86,7 @@ class Agent:
         self.long_term_memory = LongTermMemory()
         self.browsing_agent = None
         self.client_sid = None
+        self.user_key = None
         self.images = []
         # self.actions_instructions = self.load_actions_from_file("actions.txt")
         self.decision_loop_running = False
@@ -43,6 +95,9 @@ class Agent:
         self.pending_decision = False
         self.behavior = ""
         self.reminders: Dict[datetime, List[dict]] = {}
+        self.prompt_cache_usage = [] # Token usage of each decision turn, including prompt cache reads and writes
+        self.decision_semaphore = None # Optional semaphore shared between agents to bound how many decision loops run at once
+        self._stopped = threading.Event()
 
         self.reminder_thread = None
         self.reminder_thread_lock = threading.Lock()
@@ -72,13 +127,13 @@ class Agent:
        
         search_output = search(query, self.searching_logo_callback)
         # Process the search output into segments and add it to knowledge
-        self.working_memory.dump_info(search_output)
-       
-        def save_info(info, query):    
-            self.working_memory.text_to_knowledge(info, query)
-            self.working_memory.remove_info(info)
+        search_id = self.working_memory.dump_info(search_output, key=f"search-{uuid.uuid4().hex[:8]}")
+        knowledge_version = self.working_memory.knowledge_version
+        self.working_memory.ingest_in_background(search_output, query, info_key=search_id)
 
-        threading.Thread(target=save_info, args=(search_output, query)).start()
+        # Give segmentation a head start, so the next decision sees the first segments instead of racing them
+        published = self.working_memory.wait_for_knowledge(knowledge_version, KNOWLEDGE_WAIT_SEGMENTS, KNOWLEDGE_WAIT_TIMEOUT)
+        print(f"{published} knowledge segments available after the search")
         return
 
     def load_actions_from_file(self, filename):
@@ -98,120 +153,56 @@ class Agent:
     def propose_actions(self):
         """Use OpenAI API to select the best action based on memory"""
 
-        # Construct the user prompt with proposed actions and memory context
+        # The instructions and the tools are identical on every turn and form the cached prefix of the prompt;
+        # only the working memory below changes between turns
         prompt = f"""
-        You are an intelligent agent designed to propose actions based on your current working memory and a set of available actions. Your primary goal is to quickly and efficiently select the most appropriate actions for any given situation.
-
         Here is your current working memory:
         <working_memory>
         {self.working_memory.print()}
         </working_memory>
 
-        Your task is to propose and use the ideal action that you could potentially take at this step. Follow these steps:
-        1. Do not generate new knowledge or information. Rely solely on the information provided in your working memory. You will have information both in the form of info dumps and in the form of knowledge segments.
-        2. When using variables, check if they're available in your working memory. If not, determine the best way to obtain the needed information (e.g., asking the user, web search).
-        3. For tasks with specific times or reminders, set a reminder instead of acting immediately.
-        4. Ignore reminders from previous actions in your working memory. Only act on reminders prefixed with "REMINDER:" in your observations.
-        5. Before acting on a reminder, verify that the corresponding action hasn't already been taken.
-        6. Use the browse action for online service tasks requested by the user.
-        7. Utilize existing knowledge in your working memory before performing a web search.
-        8. After providing the user's desired output, use the wait action to pause for additional input.
-        9. Perform only one web search at a time. Make use of existing search results before initiating a new search.
-        10. Prioritize obtaining personal information from the user when necessary for task completion.
-        11. Avoid repeating queries to the user. Wait for a response if information has been requested.
-        13. IMPORTANT: Do not use placeholders for tools requiring specific inputs like email addresses; ask the user for the actual information first instead.
-        14. IMPORTANT: If you have information / knowledge in your working memory already, do not use search again. 
-        15. IMPORTANT: If you have already replied to the user, do not reply again with the same message. Wait for the user. Don't repeat the same reply multiple times.
-        16. IMPORTANT: You can view the previous actions in your working memory. Don't repeat the same action multiple times. If you have made an action before, DO NOT meaninnglessly repeat it.
-        17. IMPORTANT: If you have already sent the user an email about something, you do not need to send another one. Instead, you can reply to them informing them that the email has been sent.
-
-        Before proposing an action, wrap your reasoning process inside <action_analysis> tags:
-
-        1. Identify the current task or query from the working memory.
-        2. List all possible actions that could be taken.
-        3. Check for any reminders or time-sensitive tasks in the working memory.
-        4. For each possible action:
-            a. Evaluate it against the given constraints and instructions.
-            b. Consider its relevance and priority in the current context.
-            c. Analyze potential short-term and long-term outcomes.
-            d. If the action requires information from the user, check if you have already asked for it. If so, do not ask again. If not, reply and ask the information first. 
-        5. Determine the most appropriate action based on your evaluation.
-        6. Double-check that the chosen action adheres to all constraints, especially tool usage and instruction following.
-        7. Consider any potential consequences or follow-up actions that may be needed.
-        8. IMPORTANT: Ensure that the agent does not require you to enter any placeholders for specific inputs. If it does, use reply to get the information instead.
-        9. IMPORTANT: Ensure that the action is not a repeat of a previous action. If it is, do not propose it, do something else. 
-
-        After your reasoning, provide a brief summary of your proposed action and then execute it using the appropriate tool. Your response should be concise and action-oriented.
-
-        Example output structure:
-
-        <action_analysis>
-        [Your step-by-step reasoning process]
-        </action_analysis>
-
-        Proposed Action: [Brief description of the chosen action]
-
-        [Execute the action using the appropriate tool]
-
-        Remember to prioritize quick and efficient responses while strictly adhering to the given instructions and constraints.
+        Propose the ideal action to take at this step and execute it using the appropriate tool.
         """
 
         tools = get_available_tools(self.selected_actions)
 
         print("Checkpoint 2")
 
-        response = use_claude_tools(prompt, images=self.images, tools=tools)
+        # Stream the decision so that a reply reaches the user token by token
+        response = use_claude_tools(prompt, system_prompt=DECISION_SYSTEM_PROMPT, images=self.images, tools=tools, cache_prefix=True,
+                                    stream=self.reply_streaming_callback is not None, on_reply_delta=self.reply_streaming_callback)
 
         print("Checkpoint 3")
 
         print("RESPONSE: ", response)
-        # response = use_claude_tools(prompt, images=self.images, tools=tools, stream=True)
+
+        self.record_prompt_cache_usage(response.get("usage") if response else None)
 
         return response
 
 
+    def record_prompt_cache_usage(self, usage):
+        """Keep the prompt cache usage of a decision turn, and log how many input tokens were served from the cache"""
+        if not usage:
+            return
+        self.prompt_cache_usage.append(usage)
+        total_input = usage["input_tokens"] + usage["cache_read_input_tokens"] + usage["cache_creation_input_tokens"]
+        hit_rate = usage["cache_read_input_tokens"] / total_input if total_input else 0
+        print(f"Prompt cache: {usage['cache_read_input_tokens']} tokens read, {usage['cache_creation_input_tokens']} written, "
+              f"{usage['input_tokens']} uncached ({hit_rate:.0%} of input tokens from cache)")
+
     def execute_action(self, action):
         """Executes the selected action"""
         isFinal = False
 
         isDecisionNeeded = False
-        # full_response = ""
-
-        # full_reply_string = ""
         isAsync = False
-        # tag_used = False
-        # tool_used = None 
-
-        # for message in response:
-        #     print("MESSAGE: ", message)
-        #     if message.type == "content_block_delta":
-        #         if message.delta.type == "input_json_delta":
-        #             full_response += message.delta.partial_json
-        #             if (tool_used == "reply"):
-        #                 if '"message":' in full_response:
-        #                     # Extract content between "message": and the next quote or brace
-        #                     msg_content = full_response.split('"message":')[1].split('"')[1]
-
-        #                     print("Slightly cleaned up reply: ", msg_content)
-        #                     # Remove any surrounding quotes or braces
-        #                     if msg_content:  # Only send non-empty content
-        #                         print("STREAMING REPLY: ", msg_content)
-        #                         self.reply_streaming_callback(msg_content)
-                       
-        #     elif message.type == "content_block_start":
-        #         tool_used = message.content_block.name
-        #         print("TOOL USED: ", tool_used)
-
-        # action = {
-        #     "tool": tool_used,
-        #     "input": json.loads(full_response)
-        # }
-
 
         # get the first word of the action
         action_name = action["tool"]
         
-        action_to_store = action
+        # Only the tool call itself goes into working memory, not the token usage or stream id kept alongside it
+        action_to_store = {"tool": action["tool"], "input": action["input"]}
 
         print("ACTION NAME: ", action_name)
 
@@ -221,7 +212,10 @@ class Agent:
             if "<wait>" in reply_message:
                 reply_message = reply_message.replace("<wait>", "")
                 isFinal = True
-            if self.reply_callback:
+            if action.get("streamed") and self.reply_streaming_callback:
+                # The user has already seen the reply come in; send the final text to replace the streamed one
+                self.reply_streaming_callback(reply_message, action["stream_id"])
+            elif self.reply_callback:
                 self.reply_callback(reply_message, self.client_sid)
 
             action_to_store = "Reply successfully sent to user: " + reply_message
@@ -284,7 +278,7 @@ class Agent:
             # #     self.restart_loop()
             # threading.Thread(target=browse_and_complete, args=(intention,)).start()
 
-            self.browsing_agent = BrowsingAgent(self.browser_view_callback)
+            self.browsing_agent = BrowsingAgent(self.browser_view_callback, user_key=self.user_key)
             self.browsing_agent.browse(intention)
             # isAsync = True
         
@@ -328,13 +322,20 @@ class Agent:
         """Main decision-making loop"""
         print("Checkpoint 1: Starting decision loop")
         self.decision_loop_running = True
-        while self.decision_loop_running:
-            self.pending_decision = False
-            action = self.propose_actions()
-            is_final = self.execute_action(action)
-            
-            if is_final:
-                self.decision_loop_running = False
+        if self.decision_semaphore:
+            self.decision_semaphore.acquire()
+        try:
+            while self.decision_loop_running:
+                self.pending_decision = False
+                action = self.propose_actions()
+                is_final = self.execute_action(action)
+                
+                if is_final:
+                    self.decision_loop_running = False
+        finally:
+            self.decision_loop_running = False
+            if self.decision_semaphore:
+                self.decision_semaphore.release()
     
     def receive_input(self, input, client_sid, images=[], selectedActions=[], behaviorText=""):
         """Receive input from the user"""
@@ -374,15 +375,20 @@ class Agent:
     
     def reset(self):
         """Reset the agent to its initial state"""
+        self.working_memory.close()
         self.working_memory = WorkingMemory()
         self.long_term_memory = LongTermMemory()
 
+    def shutdown(self):
+        """Stop the decision loop after its current action and stop the background threads, so the agent can be discarded"""
+        self.decision_loop_running = False
+        self._stopped.set()
+        self.working_memory.close()
 
-    
 
     def _check_reminders(self):
         """Background thread that checks for due reminders"""
-        while True:
+        while not self._stopped.is_set():
             current_time = datetime.now()
             reminders_to_process = []
 
@@ -408,7 +414,7 @@ class Agent:
             # TODO: Add a check for reminders that are due
             
             # Sleep for a short interval before next check
-            time.sleep(60)  # Check every minute
+            self._stopped.wait(60)  # Check every minute
     def process_reminder(self, reminder):
         """Process a due reminder"""
         # Add reminder context to working memory
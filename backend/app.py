@@ -3,7 +3,10 @@ from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 from agent import Agent
 from memory.lt_memory import LongTermMemory
+from helper import embeddings
+from session_manager import SessionManager
 import os
+import threading
 import base64
 
 app = Flask(__name__)
@@ -19,31 +22,56 @@ def _build_cors_preflight_response():
 
 def agent_reply_handler(message, client_sid):
     """Callback function to handle agent replies"""
-    socketio.send({"message": message})
+    socketio.send({"message": message}, to=client_sid)
     print(f"Message emitted: {message}")
 
-def agent_reply_streaming_handler(message):
-    """Callback function to handle agent replies"""
-    socketio.emit('reply_stream', {"message": message})
+def agent_reply_streaming_handler(message, stream_id, client_sid):
+    """Callback function to handle agent replies as they stream in; each reply has its own stream id"""
+    socketio.emit('reply_stream', {"message": message, "id": stream_id}, to=client_sid)
     print(f"Message emitted: {message}")
 
-def browser_view_handler(url):
+def browser_view_handler(url, client_sid):
     """Callback function to send the url to view the browser being used"""
-    socketio.emit('browsing_url', {"url": url})
+    socketio.emit('browsing_url', {"url": url}, to=client_sid)
     print(f"URL emitted: {url}")
 
-def searching_handler(urls):
+def searching_handler(urls, client_sid):
     """Callback function to tell the frontend that the agent is searching"""
     print("SEARCHING EMITTED: True")
-    socketio.emit('searching', True)
+    socketio.emit('searching', True, to=client_sid)
     print(f"Searching emitted: True")
 
-def searching_logo_handler(logo_url):
+def searching_logo_handler(logo_url, client_sid):
     """Callback function to tell the frontend each logo url as it's searching for it"""
     print("SEARCHING LOGO EMITTED: ", logo_url)
-    socketio.emit('searching_logo', {"url": logo_url})
+    socketio.emit('searching_logo', {"url": logo_url}, to=client_sid)
     print(f"Searching logo emitted: {logo_url}")
 
+def create_agent(session_key):
+    """Create an agent whose callbacks only reach the client that currently owns its session"""
+    agent = Agent()
+    # Only agents of a real user get a persistent browser; agents keyed by a socket browse in throwaway sessions
+    agent.user_key = None if session_key == request.sid else session_key
+    agent.reply_callback = agent_reply_handler
+    agent.reply_streaming_callback = lambda message, stream_id: agent_reply_streaming_handler(message, stream_id, agent.client_sid)
+    agent.browser_view_callback = lambda url: browser_view_handler(url, agent.client_sid)
+    agent.searching_callback = lambda urls: searching_handler(urls, agent.client_sid)
+    agent.searching_logo_callback = lambda logo_url: searching_logo_handler(logo_url, agent.client_sid)
+    return agent
+
+sessions = SessionManager(create_agent)
+
+def session_key(data=None):
+    """Agents are keyed by the user id when the client sends one, and by the socket otherwise"""
+    user_id = data.get('user_id') if isinstance(data, dict) else None
+    return str(user_id) if user_id else request.sid
+
+def get_agent(data=None):
+    """The agent of the requesting client, now owned by this socket"""
+    agent = sessions.get(session_key(data))
+    agent.client_sid = request.sid
+    return agent
+
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
@@ -51,12 +79,14 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    # Agents keyed by the socket can never be reached again; agents keyed by a user id wait for a reconnect until they expire
+    sessions.remove(request.sid)
 
 @socketio.on('start')
 def handle_start(data):
     selectedActions = data.get('selectedActions')
     behavior = data.get('behavior')
-    agent.start(selectedActions, behavior)
+    get_agent(data).start(selectedActions, behavior)
 
 @socketio.on('user_message')
 def handle_message(data):
@@ -67,26 +97,24 @@ def handle_message(data):
     images = []
     for image in received_images:
         images.append({"image": image, "text": text})
-    
+
     # Process the message
     full_input = text if text else ""
 
-    
+
     print("FULL INPUT", full_input)
     client_sid = request.sid
-    agent.receive_input(full_input, client_sid, images=images, selectedActions=selectedActions, behaviorText=behaviorText)
+    get_agent(data).receive_input(full_input, client_sid, images=images, selectedActions=selectedActions, behaviorText=behaviorText)
 
 @socketio.on('reset')
-def handle_reset():
-    agent.reset()
+def handle_reset(data=None):
+    agent = sessions.peek(session_key(data))
+    if agent:
+        agent.reset()
 
 if __name__ == "__main__":
-    agent = Agent()
-    print("Agent is ready. Starting Flask server...")
-    agent.reply_callback = agent_reply_handler
-    agent.reply_streaming_callback = agent_reply_streaming_handler
-    agent.browser_view_callback = browser_view_handler
-    agent.searching_callback = searching_handler
-    agent.searching_logo_callback = searching_logo_handler
+    print("Session manager is ready. Starting Flask server...")
+    # Load the embedding model in the background so the server can start serving right away
+    threading.Thread(target=embeddings.get_model, daemon=True).start()
     print("Agent is ready. Starting SocketIO server...")
-    socketio.run(app, port=7777)
\ No newline at end of file
+    socketio.run(app, port=7777)
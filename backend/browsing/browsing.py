@@ -1,124 +1,86 @@
 import os
 import time
 import json
-import base64
-from browserbase import Browserbase
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from helper_functions import use_claude
+from browsing.session_pool import get_session_pool
+from browsing.screenshots import FrameTracker
+from browsing.element_index import ElementIndex
 
 load_dotenv()
 
-BROWSERBASE_API_KEY = os.environ["BROWSERBASE_API_KEY"]
-BROWSERBASE_PROJECT_ID = os.environ["BROWSERBASE_PROJECT_ID"]
-
-bb = Browserbase(api_key=BROWSERBASE_API_KEY)
+ELEMENT_ACTION_TIMEOUT = 10000  # ms to wait for an element to become actionable
 
 class BrowsingAgent:
-    def __init__(self, callback):
+    def __init__(self, callback, session_pool=None, user_key=None):
         self.playwright = None
         self.browser = None
         self.page = None
+        self.session = None
+        self.session_pool = session_pool
+        self.user_key = user_key  # without one, the task gets a throwaway browser that is closed afterwards
         self.browser_view_callback = callback
         self.client_sid = None
         self.actions = []
         self.current_screenshot = None
+        self.frame_tracker = FrameTracker()
+        self.element_index = None
         self.cursor_location = {
             "x": 0,
             "y": 0
         }
 
     def start_session(self):
-        # Create session with proxies and stealth mode settings
-        session = bb.sessions.create(
-            project_id=BROWSERBASE_PROJECT_ID,
-            proxies=True,
-        )
-        debug_urls = bb.sessions.debug(session.id)
-        debug_connection_url = debug_urls.debugger_fullscreen_url
-
-        self.browser_view_callback(debug_connection_url)
-        print("BROWSER VIEW URL: ", debug_connection_url)
-
-        chromium = self.playwright.chromium
-        self.browser = chromium.connect_over_cdp(session.connect_url)
-        context = self.browser.contexts[0]
-        self.page = context.pages[0]
+        # Take a pre-warmed session from the pool (the user's own one if they browsed before, so logins carry over)
+        if self.session_pool is None:
+            self.session_pool = get_session_pool()
+        self.session = self.session_pool.acquire(self.user_key)
 
-        # Set longer timeout for proxy connections
-        self.page.set_default_navigation_timeout(60000)
+        try:
+            if self.session.debug_url:
+                self.browser_view_callback(self.session.debug_url)
+                print("BROWSER VIEW URL: ", self.session.debug_url)
+
+            chromium = self.playwright.chromium
+            self.browser = chromium.connect_over_cdp(self.session.connect_url)
+            context = self.browser.contexts[0]
+            self.page = context.pages[0] if context.pages else context.new_page()
+            self.element_index = ElementIndex(self.page)
+
+            # Set longer timeout for proxy connections
+            self.page.set_default_navigation_timeout(60000)
+        except Exception:
+            # A session we could not connect to is not worth keeping
+            self.session_pool.discard(self.session)
+            self.session = None
+            raise
+
+    def end_session(self):
+        """Disconnect from the browser and hand the session back to the pool (or close it, if it was a throwaway one)"""
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception as e:
+                print("ERROR DISCONNECTING FROM BROWSER: ", e)
+            self.browser = None
+        if self.session is not None:
+            if self.user_key is None:
+                self.session_pool.discard(self.session)
+            else:
+                self.session_pool.release(self.session)
+            self.session = None
 
 
     def get_browser_screenshot(self):
-
-        # Take screenshot and encode as base64
+        """The images of the current browser state to send with the next step (see FrameTracker)"""
         screenshot_bytes = self.page.screenshot()
-
-        # Create PIL Image from screenshot bytes
-        from PIL import Image, ImageDraw, ImageFont
-        import io
-        
-        # Open screenshot and cursor image
-        image = Image.open(io.BytesIO(screenshot_bytes))
-        cursor = Image.open("browsing/images/cursor.png")
-        
-        # Resize cursor to be 3.5x smaller
-        cursor_width = int(cursor.width / 7.5)
-        cursor_height = int(cursor.height / 7.5)
-        cursor = cursor.resize((cursor_width, cursor_height))
-        
-        # Calculate position to paste cursor (centered on cursor location)
-        cursor_x = int(self.cursor_location["x"])
-        cursor_y = int(self.cursor_location["y"])
-
-        print("Cursor location: ", cursor_x, cursor_y)
-        
-        # Paste cursor onto screenshot
-        image.paste(cursor, (cursor_x, cursor_y), cursor if cursor.mode == 'RGBA' else None)
-
-        # Create drawing context and font
-        draw = ImageDraw.Draw(image)
-        try:
-            # Use a smaller font size to match the reference image
-            font = ImageFont.truetype("Arial", 12)
-        except:
-            font = ImageFont.load_default()
-
-        width, height = image.size
-
-        # Draw the axes labels (X and Y) in top left corner
-        draw.text((0, 0), "Y", fill='black', font=font)
-        draw.text((15, 0), "X", fill='black', font=font)
-
-        # Draw vertical grid lines and labels every 50 pixels
-        for x in range(0, width, 50):
-            # Draw vertical line
-            draw.line([(x, 0), (x, height)], fill='black', width=1)
-            
-            # Draw x-axis label at top
-            if x > 0:  # Skip 0 since we have X/Y labels there
-                draw.text((x, 0), str(x), fill='black', font=font)
-
-        # Draw horizontal grid lines every 50 pixels
-        for y in range(0, height, 50):
-            # Draw horizontal line
-            draw.line([(0, y), (width, y)], fill='black', width=1)
-            
-            # Draw y-axis label on left
-            if y > 0:  # Skip 0 since we have X/Y labels there
-                draw.text((0, y), str(y), fill='black', font=font)
-
-        # Convert to bytes and encode as base64
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        screenshot_bytes = img_byte_arr.getvalue()
-        # Save and encode
-        image.save("screenshot.png")
-        screenshot_base64 = base64.b64encode(screenshot_bytes).decode()
-
-        return {"image": f"data:image/png;base64,{screenshot_base64}", "text": "Current browser screenshot"}
+        print("Cursor location: ", self.cursor_location["x"], self.cursor_location["y"])
+        return self.frame_tracker.frames(screenshot_bytes, self.cursor_location)
 
     def pick_action(self, task):
+        self.element_index.refresh()
+
         prompt = f"""
         You are a browsing agent. You have been given a main task to complete. 
         You also have information about the current state of the browser. 
@@ -130,12 +92,17 @@ class BrowsingAgent:
         
         1. When you want to click on something to highlight it, ensure that the tip of the cursor is inside the element you want to click on.
         2. The screenshot you have been provided with the image is the most updated state of the browser. If you have taken an action that is not reflected in the screenshot, something went wrong.
+        3. Prefer the element actions whenever the element you want is in the list of interactive elements below; they act on the element directly, without moving the cursor first. Use the cursor only for things that are not in the list.
 
         # Current Browser State
 
         Current URL: {self.page.url}
         Current Page Title: {self.page.title}
 
+        # Interactive elements in view
+        [id] role "name" and position of each element
+        {self.element_index.describe()}
+
         # Task
         {task}
         
@@ -155,6 +122,11 @@ class BrowsingAgent:
         2. click -> Click the mouse.
         3. scroll <amount> -> Scroll the page by the given amount. Please note that your mouse should be above the scrollable element when you do this. This amount can be negative or positive.
 
+        ## Element Actions
+        1. click_element <ID> -> Click the element with the given id from the list of interactive elements.
+        2. hover_element <ID> -> Move the cursor over the element with the given id.
+        3. fill_element <ID> "TEXT" -> Replace the contents of the input field with the given id with the given text.
+
         ## Data Actions
         1. enter "TEXT" -> Enter the given text into the current input field. Only take this action if you have currently focused on an input field.
         2. delete <x> -> Delete the last x characters typed.
@@ -175,8 +147,8 @@ class BrowsingAgent:
         print("PROMPT: ", prompt)
         
         try:
-            screenshot = self.get_browser_screenshot()
-            response = use_claude(prompt, images=[screenshot], sonnet=True)
+            screenshots = self.get_browser_screenshot()
+            response = use_claude(prompt, images=screenshots, sonnet=True)
         except Exception as e:
             print("ERROR GETTING BROWSER SCREENSHOT: ", e)
             response = use_claude(prompt)
@@ -217,6 +189,29 @@ class BrowsingAgent:
                 "x": row,
                 "y": column
             }
+        elif action.startswith("click_element") or action.startswith("hover_element") or action.startswith("fill_element"):
+            parts = action.split(None, 2)
+            try:
+                if len(parts) < 2:
+                    raise ValueError(f"{parts[0]} needs the id of an element from the element list")
+                element = self.element_index.locator(parts[1])
+                if action.startswith("click_element"):
+                    element.click(timeout=ELEMENT_ACTION_TIMEOUT)
+                elif action.startswith("hover_element"):
+                    element.hover(timeout=ELEMENT_ACTION_TIMEOUT)
+                else:
+                    if len(parts) < 3:
+                        raise ValueError("fill_element needs the text to enter after the element id")
+                    text = parts[2].strip()
+                    if text.startswith('"') and text.endswith('"'):
+                        text = text[1:-1]
+                    element.fill(text, timeout=ELEMENT_ACTION_TIMEOUT)
+                self.cursor_location = self.element_index.center(parts[1])
+            except (ValueError, IndexError, KeyError, PlaywrightTimeoutError, PlaywrightError) as e:
+                # Tell the model on the next step instead of failing the whole task
+                reason = e.args[0] if isinstance(e, KeyError) else (str(e).splitlines() or [type(e).__name__])[0]
+                print("ELEMENT ACTION FAILED: ", reason)
+                self.actions.append(f"Failed: {reason}")
         elif action.startswith("click"):
             self.page.mouse.down()
             self.page.mouse.up()
@@ -244,21 +239,23 @@ class BrowsingAgent:
 
         with sync_playwright() as playwright:
             self.playwright = playwright
-            self.start_session()
 
-            
-           
+            try:
+                self.start_session()
+
+                while True:
 
-            while True:
+                    action = self.pick_action(task)
+                    
+                    print("BrowsingAgent picked action: ", action)
+                    
+                    done = self.execute_action(action)
+                    if done:
+                        break
+            finally:
+                print(f"Screenshots: {self.frame_tracker.stats}, vision tokens saved: {self.frame_tracker.stats['tokens_saved']}")
+                self.end_session()
 
-                action = self.pick_action(task)
-                
-                print("BrowsingAgent picked action: ", action)
-                
-                done = self.execute_action(action)
-                if done:
-                    break
-                
 
 if __name__ == "__main__":
     task = "open doordash and order me a Taco Bell burrito!"
@@ -0,0 +1,151 @@
+"""
+An index of the interactive elements on the current page, so the browsing agent can act on elements directly instead of
+moving the cursor to pixel coordinates over several screenshot round trips.
+
+Every visible interactive element (links, buttons, inputs, elements with an interactive ARIA role, ...) in the viewport
+gets a numeric id, its role and accessible name and its bounding box. Ids are stored on the elements themselves as a
+data attribute, so they stay the same while the element is on the page and actions can target them with a locator.
+
+The index is refreshed incrementally: a MutationObserver and scroll/resize listeners in the page mark it dirty, and a
+refresh is a no-op until something changed. Navigating to a new document starts a new index.
+"""
+
+ID_ATTRIBUTE = "data-sentient-id"
+MAX_ELEMENTS = 150
+MAX_NAME_CHARS = 80
+
+INDEX_SCRIPT = """
+([idAttribute, maxElements, maxNameChars, force]) => {
+    let state = window.__sentientIndex;
+    if (!state) {
+        state = window.__sentientIndex = {next: 1, dirty: true};
+        // Any change to the page other than our own id attributes makes the next refresh rescan it
+        new MutationObserver(records => {
+            if (records.some(record => record.attributeName !== idAttribute)) state.dirty = true;
+        }).observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+        window.addEventListener("scroll", () => { state.dirty = true; }, true);
+        window.addEventListener("resize", () => { state.dirty = true; });
+    }
+    if (!state.dirty && !force) return null;
+    state.dirty = false;
+
+    const selector = [
+        "a[href]", "button", "input:not([type=hidden])", "select", "textarea", "summary", "[contenteditable=''], [contenteditable=true]",
+        "[role=button]", "[role=link]", "[role=checkbox]", "[role=radio]", "[role=tab]", "[role=menuitem]", "[role=option]",
+        "[role=switch]", "[role=combobox]", "[role=textbox]", "[role=searchbox]", "[onclick]", "[tabindex]:not([tabindex='-1'])",
+    ].join(",");
+    const inputRoles = {checkbox: "checkbox", radio: "radio", submit: "button", button: "button", reset: "button", image: "button", range: "slider", search: "searchbox"};
+    const implicitRoles = {A: "link", BUTTON: "button", SELECT: "combobox", TEXTAREA: "textbox", SUMMARY: "button"};
+    const clean = text => (text || "").replace(/\\s+/g, " ").trim().slice(0, maxNameChars);
+
+    const nameOf = element => {
+        const labelledBy = (element.getAttribute("aria-labelledby") || "").split(/\\s+/)
+            .map(id => document.getElementById(id)).filter(Boolean).map(label => label.innerText).join(" ");
+        const image = element.querySelector && element.querySelector("img[alt]");
+        return clean(element.getAttribute("aria-label") || labelledBy || (element.labels && element.labels[0] && element.labels[0].innerText)
+            || element.getAttribute("alt") || (image && image.alt) || element.getAttribute("title")
+            || element.getAttribute("placeholder") || element.innerText || (element.type !== "password" && element.value));
+    };
+
+    const elements = [];
+    for (const element of document.querySelectorAll(selector)) {
+        if (elements.length >= maxElements) break;
+        const rect = element.getBoundingClientRect();
+        if (rect.width < 1 || rect.height < 1 || rect.bottom < 0 || rect.right < 0 || rect.top > innerHeight || rect.left > innerWidth) continue;
+        const style = getComputedStyle(element);
+        if (style.visibility === "hidden" || style.display === "none" || style.opacity === "0") continue;
+        // Skip elements covered by something else, e.g. behind a modal
+        const x = Math.min(Math.max(rect.left + rect.width / 2, 0), innerWidth - 1), y = Math.min(Math.max(rect.top + rect.height / 2, 0), innerHeight - 1);
+        const hit = document.elementFromPoint(x, y);
+        if (hit && !element.contains(hit) && !hit.contains(element)) continue;
+        // Only the outermost of nested interactive elements (e.g. a button inside a link) is indexed
+        if (element.parentElement && element.parentElement.closest(selector) && elements.some(other => other.element.contains(element))) continue;
+
+        if (!element.hasAttribute(idAttribute)) element.setAttribute(idAttribute, state.next++);
+        const type = (element.getAttribute("type") || "").toLowerCase();
+        elements.push({
+            element,
+            id: Number(element.getAttribute(idAttribute)),
+            role: element.getAttribute("role") || (element.tagName === "INPUT" ? inputRoles[type] || "textbox" : implicitRoles[element.tagName]) || "generic",
+            name: nameOf(element),
+            value: ["INPUT", "TEXTAREA", "SELECT"].includes(element.tagName) && type !== "password" ? clean(element.value) : null,
+            checked: ["checkbox", "radio"].includes(type) ? element.checked : null,
+            disabled: element.disabled === true || element.getAttribute("aria-disabled") === "true",
+            box: {x: Math.round(rect.left), y: Math.round(rect.top), width: Math.round(rect.width), height: Math.round(rect.height)},
+        });
+    }
+    return elements.map(({element, ...rest}) => rest);
+}
+"""
+
+
+def parse_element_id(text):
+    """The numeric id in an action argument, which the model may write as 12, [12] or #12"""
+    cleaned = str(text).strip().strip("[]#").strip()
+    if not cleaned.isdigit():
+        raise ValueError(f"{text!r} is not an element id; use the number in brackets from the element list")
+    return int(cleaned)
+
+
+class ElementIndex:
+    def __init__(self, page, max_elements=MAX_ELEMENTS):
+        self.page = page
+        self.max_elements = max_elements
+        self.elements = {}  # id -> {"id", "role", "name", "value", "checked", "disabled", "box"}
+        self.url = None
+        self.refreshes = 0
+        self._navigated = True
+        page.on("framenavigated", self._on_navigated)
+
+    def _on_navigated(self, frame):
+        # A new document has a new id counter, so the ids of the old one no longer mean anything. Same-document
+        # navigations (history API) keep their ids but still need a rescan, which the page may not have flagged
+        if frame == self.page.main_frame:
+            self.elements = {}
+            self.url = frame.url
+            self._navigated = True
+
+    def refresh(self):
+        """Update the index from the page if it changed since the last refresh; returns the elements by id"""
+        try:
+            elements = self.page.evaluate(INDEX_SCRIPT, [ID_ATTRIBUTE, self.max_elements, MAX_NAME_CHARS, self._navigated])
+        except Exception as e:
+            # The page is navigating or closed; keep the last index until the next refresh
+            print(f"Error indexing page elements: {e}")
+            return self.elements
+        self._navigated = False
+        if elements is not None:
+            previous = self.elements
+            self.elements = {element["id"]: element for element in elements}
+            self.url = self.page.url
+            self.refreshes += 1
+            added = len(self.elements.keys() - previous.keys())
+            removed = len(previous.keys() - self.elements.keys())
+            print(f"Element index refreshed: {len(self.elements)} elements ({added} new, {removed} gone)")
+        return self.elements
+
+    def describe(self):
+        """The indexed elements as lines for the prompt, top to bottom and left to right"""
+        lines = []
+        for element in sorted(self.elements.values(), key=lambda element: (element["box"]["y"], element["box"]["x"])):
+            box = element["box"]
+            line = f'[{element["id"]}] {element["role"]} "{element["name"]}" at x={box["x"]}, y={box["y"]}, {box["width"]}x{box["height"]}'
+            if element["value"]:
+                line += f', value "{element["value"]}"'
+            if element["checked"] is not None:
+                line += ", checked" if element["checked"] else ", unchecked"
+            if element["disabled"]:
+                line += ", disabled"
+            lines.append(line)
+        return "\n".join(lines) if lines else "No interactive elements found in the viewport."
+
+    def locator(self, element_id):
+        """A Playwright locator for an indexed element"""
+        element_id = parse_element_id(element_id)
+        if element_id not in self.elements:
+            raise KeyError(f"No element with id {element_id} on the page; it may have been removed")
+        return self.page.locator(f'[{ID_ATTRIBUTE}="{element_id}"]').first
+
+    def center(self, element_id):
+        box = self.elements[parse_element_id(element_id)]["box"]
+        return {"x": box["x"] + box["width"] // 2, "y": box["y"] + box["height"] // 2}
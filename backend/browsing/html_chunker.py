@@ -0,0 +1,107 @@
+"""
+Chunking of page HTML for LLM-based element location.
+
+Pages are cleaned of scripts, styles and other markup that never describes a clickable element, then cut into chunks
+of at most max_chars on element boundaries in a single pass over the tags. Chunks are ranked against the description of
+the element with BM25 over their text and attribute values and sent to the LLM in batches of the best few, in parallel;
+the first chunk that contains the element wins and the remaining calls are cancelled. Only if no chunk of a batch has
+the element is the next batch tried.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from searching.passages import bm25_scores
+
+CHUNK_CHARS = 20000
+CANDIDATE_CHUNKS = 6
+LOCATE_CONCURRENCY = 3
+
+NOISE = re.compile(r"<(script|style|noscript|svg|template|iframe)\b.*?</\1\s*>|<!--.*?-->|<(?:link|meta)\b[^>]*>", re.IGNORECASE | re.DOTALL)
+WHITESPACE = re.compile(r"\s{2,}")
+TAG = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>")
+# Attributes that describe an element the way a user would (plus id and name, which the locator can use)
+DESCRIPTIVE_ATTRIBUTE = re.compile(r"""\b(?:aria-label|placeholder|title|alt|value|name|id)\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+BLOCK_TAGS = {
+    "div", "section", "article", "main", "nav", "header", "footer", "aside", "form", "ul", "ol", "li", "table", "tr",
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "fieldset", "dialog", "details",
+}
+
+
+def strip_noise(html):
+    """The HTML without scripts, styles, comments and other markup that holds no locatable elements"""
+    return WHITESPACE.sub(" ", NOISE.sub("", html))
+
+
+def chunk_html(html, max_chars=CHUNK_CHARS):
+    """Split HTML into chunks of at most max_chars, cutting between block elements where possible"""
+    chunks = []
+    start = 0
+    boundary = 0  # the latest position right before a block element
+    for match in TAG.finditer(html):
+        # Cut at the last block boundary when this tag would overflow the chunk
+        if match.end() - start > max_chars and boundary > start:
+            chunks.append(html[start:boundary])
+            start = boundary
+        # Otherwise right before this tag, and a run of text (or a tag) longer than max_chars is cut anywhere
+        while match.end() - start > max_chars:
+            cut = match.start() if start < match.start() <= start + max_chars else start + max_chars
+            chunks.append(html[start:cut])
+            start = cut
+        if not match.group(1) and match.group(2).lower() in BLOCK_TAGS:
+            boundary = match.start()
+    # Text longer than max_chars without any tags is cut anywhere
+    while len(html) - start > max_chars:
+        chunks.append(html[start:start + max_chars])
+        start += max_chars
+    if start < len(html):
+        chunks.append(html[start:])
+    return chunks
+
+
+def chunk_terms(chunk):
+    """The words of a chunk that can describe an element: its text and descriptive attribute values"""
+    return " ".join(DESCRIPTIVE_ATTRIBUTE.findall(chunk)) + " " + TAG.sub(" ", chunk)
+
+
+def rank_chunks(description, chunks, top_k=None):
+    """The chunks most likely to contain the described element, best first (the first top_k, or all of them)"""
+    if len(chunks) <= 1:
+        return chunks
+    scores = bm25_scores(description, [chunk_terms(chunk) for chunk in chunks])
+    order = sorted(range(len(chunks)), key=lambda i: -scores[i])
+    return [chunks[i] for i in order[:top_k]]
+
+
+def find_in_chunks(description, chunks, ask, batch_size=CANDIDATE_CHUNKS, concurrency=LOCATE_CONCURRENCY):
+    """
+    Ask about the chunks with ask(chunk), which returns a result or None if the element is not in the chunk. Chunks are
+    asked about best first, in batches of batch_size, concurrency at a time. Returns the first result found, cancelling
+    the calls that have not started, or None once every chunk has been tried.
+    """
+    ranked = rank_chunks(description, chunks)
+    for start in range(0, len(ranked), batch_size):
+        result = ask_batch(ranked[start:start + batch_size], ask, concurrency)
+        if result is not None:
+            return result
+        if start + batch_size < len(ranked):
+            print(f"Element not in the best {start + batch_size} of {len(ranked)} chunks, trying the next ones")
+    return None
+
+
+def ask_batch(candidates, ask, concurrency=LOCATE_CONCURRENCY):
+    """The first non-None result of ask over the candidates, asked in parallel"""
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(candidates)))
+    futures = [executor.submit(ask, chunk) for chunk in candidates]
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error locating element in chunk: {e}")
+                continue
+            if result is not None:
+                return result
+        return None
+    finally:
+        # Calls already in flight finish in the background; their results are ignored
+        executor.shutdown(wait=False, cancel_futures=True)
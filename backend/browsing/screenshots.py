@@ -0,0 +1,192 @@
+"""
+Annotated browser screenshots for the browsing agent: the page with a coordinate grid and the cursor drawn on it.
+
+The grid overlay (lines and labels) only depends on the viewport size and the cursor sprite never changes, so both are
+rendered once and cached; each frame is then the screenshot with the cached overlay pasted on in one operation, plus the
+small cursor sprite. Frames are encoded as JPEG (or WebP) at SCREENSHOT_QUALITY, which is much smaller and cheaper to
+encode than PNG, and are never written to disk.
+
+FrameTracker compares consecutive screenshots so that steps which change little or nothing on the page (moving the
+cursor, waiting) send a small overview and a crop instead of another full screenshot.
+"""
+
+import io
+import os
+import base64
+import numpy as np
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "JPEG").upper()  # JPEG, WEBP or PNG
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", 80))
+GRID_SPACING = 50
+CURSOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "cursor.png")
+CURSOR_SCALE = 7.5
+
+# Change detection between consecutive screenshots (see FrameTracker)
+TILE_SIZE = 32
+TILE_CHANGE_THRESHOLD = 1.0  # mean absolute grayscale difference for a tile to count as changed
+FULL_FRAME_EVERY = int(os.getenv("SCREENSHOT_FULL_FRAME_EVERY", 4))  # partial frames in a row before a full one again
+OVERVIEW_SCALE = 0.5
+CROP_MARGIN = 150  # pixels around the cursor included in the crop
+MAX_CROP_FRACTION = 0.4  # larger crops are not worth it, the full frame is sent instead
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@lru_cache(maxsize=1)
+def cursor_sprite():
+    """The cursor image, scaled down once"""
+    cursor = Image.open(CURSOR_PATH).convert("RGBA")
+    return cursor.resize((int(cursor.width / CURSOR_SCALE), int(cursor.height / CURSOR_SCALE)))
+
+
+@lru_cache(maxsize=1)
+def label_font():
+    try:
+        return ImageFont.truetype("Arial", 12)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4)
+def grid_overlay(size, spacing=GRID_SPACING):
+    """A transparent layer with the grid lines every spacing pixels and their coordinate labels, for one viewport size"""
+    width, height = size
+    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    font = label_font()
+
+    for x in range(0, width, spacing):
+        draw.line([(x, 0), (x, height)], fill="black", width=1)
+    for y in range(0, height, spacing):
+        draw.line([(0, y), (width, y)], fill="black", width=1)
+
+    # Axis labels, with X/Y in the top left corner instead of the zeros
+    draw.text((0, 0), "Y", fill="black", font=font)
+    draw.text((15, 0), "X", fill="black", font=font)
+    for x in range(spacing, width, spacing):
+        draw.text((x, 0), str(x), fill="black", font=font)
+    for y in range(spacing, height, spacing):
+        draw.text((0, y), str(y), fill="black", font=font)
+    return overlay
+
+
+def open_screenshot(screenshot_bytes):
+    return Image.open(io.BytesIO(screenshot_bytes)).convert("RGB")
+
+
+def annotate(image, cursor_location):
+    """Draw the grid and the cursor on an RGB screenshot, in place"""
+    overlay = grid_overlay(image.size)
+    image.paste(overlay, (0, 0), overlay)
+    cursor = cursor_sprite()
+    image.paste(cursor, (int(cursor_location["x"]), int(cursor_location["y"])), cursor)
+    return image
+
+
+def encode(image, format=SCREENSHOT_FORMAT, quality=SCREENSHOT_QUALITY):
+    """A data URL of the image in the given format"""
+    buffer = io.BytesIO()
+    if format == "PNG":
+        image.save(buffer, format=format)
+    else:
+        image.save(buffer, format=format, quality=quality)
+    return f"data:{MEDIA_TYPES[format]};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def vision_tokens(size):
+    """Approximate number of tokens an image of this size costs a vision model (width * height / 750)"""
+    return int(size[0] * size[1] / 750)
+
+
+class FrameTracker:
+    """
+    Decides what to send of each new screenshot by comparing it with the previous one, tile by tile.
+
+    - nothing changed and the cursor did not move: the previous full frame is sent again, without re-rendering it
+    - nothing or only a small region changed: a downscaled overview of the page plus a full-resolution crop of the
+      changed region and the area around the cursor
+    - anything else, or full_frame_every steps after the last full frame: the full screenshot
+    """
+
+    def __init__(self, tile_size=TILE_SIZE, change_threshold=TILE_CHANGE_THRESHOLD, full_frame_every=FULL_FRAME_EVERY):
+        self.tile_size = tile_size
+        self.change_threshold = change_threshold
+        self.full_frame_every = full_frame_every
+        self.stats = {"frames": 0, "full": 0, "partial": 0, "reused": 0, "tokens_sent": 0, "tokens_saved": 0}
+        self._previous = None  # grayscale pixels of the previous screenshot
+        self._previous_cursor = None
+        self._frames = None  # what was sent for the previous screenshot
+        self._since_full = 0
+
+    def changed_box(self, gray):
+        """Bounding box (x0, y0, x1, y1) of the tiles that differ from the previous screenshot, () if none, None if unknown"""
+        if self._previous is None or self._previous.shape != gray.shape:
+            return None
+        tile = self.tile_size
+        rows, columns = -(-gray.shape[0] // tile), -(-gray.shape[1] // tile)
+        padded = np.zeros((rows * tile, columns * tile), dtype=np.int16)
+        padded[:gray.shape[0], :gray.shape[1]] = np.abs(gray - self._previous)
+        changed = padded.reshape(rows, tile, columns, tile).mean(axis=(1, 3)) > self.change_threshold
+        if not changed.any():
+            return ()
+        changed_rows, changed_columns = np.nonzero(changed.any(axis=1))[0], np.nonzero(changed.any(axis=0))[0]
+        return (int(changed_columns[0]) * tile, int(changed_rows[0]) * tile,
+                min(int(changed_columns[-1] + 1) * tile, gray.shape[1]), min(int(changed_rows[-1] + 1) * tile, gray.shape[0]))
+
+    def frames(self, screenshot_bytes, cursor_location):
+        """The images to send for a new screenshot, as [{"image", "text"}]"""
+        image = open_screenshot(screenshot_bytes)
+        gray = np.asarray(image.convert("L"), dtype=np.int16)
+        cursor = (int(cursor_location["x"]), int(cursor_location["y"]))
+        box = self.changed_box(gray)
+        full_tokens = vision_tokens(image.size)
+        self._previous = gray
+        self.stats["frames"] += 1
+
+        # Partial frames describe the change since the step before them, so only full frames are sent again as they are
+        if box == () and cursor == self._previous_cursor and self._frames is not None and len(self._frames) == 1:
+            self.stats["reused"] += 1
+            frames = self._frames
+        else:
+            annotate(image, cursor_location)
+            crop_box = self.crop_box(box, cursor, image.size) if box is not None and self._since_full < self.full_frame_every else None
+            if crop_box is None:
+                frames = [{"image": encode(image), "text": "Current browser screenshot", "tokens": full_tokens}]
+                self.stats["full"] += 1
+                self._since_full = 0
+            else:
+                frames = self.partial_frames(image, box, crop_box)
+                self.stats["partial"] += 1
+                self._since_full += 1
+        self._previous_cursor = cursor
+        self._frames = frames
+
+        sent = sum(frame["tokens"] for frame in frames)
+        self.stats["tokens_sent"] += sent
+        self.stats["tokens_saved"] += full_tokens - sent
+        return [{"image": frame["image"], "text": frame["text"]} for frame in frames]
+
+    def crop_box(self, box, cursor, size):
+        """The region to send at full resolution: the changed region plus the area around the cursor, or None if too big"""
+        width, height = size
+        x0, y0 = max(cursor[0] - CROP_MARGIN, 0), max(cursor[1] - CROP_MARGIN, 0)
+        x1, y1 = min(cursor[0] + CROP_MARGIN, width), min(cursor[1] + CROP_MARGIN, height)
+        if box:
+            x0, y0, x1, y1 = min(x0, box[0]), min(y0, box[1]), max(x1, box[2]), max(y1, box[3])
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > MAX_CROP_FRACTION * width * height:
+            return None
+        return (x0, y0, x1, y1)
+
+    def partial_frames(self, image, box, crop_box):
+        width, height = image.size
+        overview = image.resize((int(width * OVERVIEW_SCALE), int(height * OVERVIEW_SCALE)), Image.BILINEAR)
+        crop = image.crop(crop_box)
+        change = "has not changed" if box == () else f"changed only between x={box[0]}, y={box[1]} and x={box[2]}, y={box[3]}"
+        return [
+            {"image": encode(overview), "tokens": vision_tokens(overview.size),
+             "text": f"Current browser screenshot, downscaled by {OVERVIEW_SCALE} (the page {change} since the previous step)"},
+            {"image": encode(crop), "tokens": vision_tokens(crop.size),
+             "text": f"Full-resolution crop of the current browser screenshot from x={crop_box[0]}, y={crop_box[1]} to x={crop_box[2]}, y={crop_box[3]}, around the cursor and the changed region"},
+        ]
@@ -0,0 +1,374 @@
+"""
+A pool of ready-to-use remote browser sessions for BrowsingAgent.
+
+Starting a Browserbase session and connecting to it takes several seconds, so sessions are created ahead of time and
+reused instead of being created for every browse action:
+- a few unassigned sessions are kept warm for throwaway tasks and, on backends that can adopt them as a user's profile
+  (local Chromium), for users who have not browsed yet. Browserbase binds a user's context when the session is created,
+  so users always get a session created for them there
+- a session is bound to a user once they use it and goes back to the pool when their browsing task ends, so the next
+  task of the same user continues in the same browser, with its cookies and logins (Browserbase also persists them in a
+  per-user context, so they survive the session itself)
+- a background thread health-checks sessions, closes the ones idle for longer than idle_timeout and tops up the warm ones
+- at most max_size sessions exist at once; when the pool is full the least recently used idle session is closed, and if
+  every session is busy acquire() waits for one to be released
+
+The backend is Browserbase by default, or a local Chromium started with a remote debugging port (BROWSER_BACKEND=local),
+which needs no API keys and is handy for development.
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import shutil
+import subprocess
+import threading
+import urllib.request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BROWSER_BACKEND = os.getenv("BROWSER_BACKEND", "browserbase")
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 8))
+BROWSER_WARM_SESSIONS = int(os.getenv("BROWSER_WARM_SESSIONS", 1))
+BROWSER_IDLE_TIMEOUT = int(os.getenv("BROWSER_IDLE_TIMEOUT", 10 * 60))
+BROWSER_ACQUIRE_TIMEOUT = int(os.getenv("BROWSER_ACQUIRE_TIMEOUT", 120))
+HEALTH_CHECK_INTERVAL = 30
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+class BrowserSession:
+    def __init__(self, id, connect_url, debug_url=None, user_key=None, handle=None):
+        self.id = id
+        self.connect_url = connect_url  # CDP endpoint to connect Playwright to
+        self.debug_url = debug_url  # live view of the browser for the frontend, if the backend has one
+        self.user_key = user_key  # None while the session is a warm, unassigned one
+        self.handle = handle  # backend specific (e.g. the local Chromium process)
+        self.in_use = False
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def __repr__(self):
+        return f"BrowserSession({self.id}, user={self.user_key}, in_use={self.in_use})"
+
+
+class BrowserbaseBackend:
+    """Sessions on Browserbase, kept alive between connections, with one persistent context (cookies, storage) per user"""
+    name = "browserbase"
+    adopts_warm_sessions = False  # the user's context can only be attached when a session is created
+
+    def __init__(self):
+        from browserbase import Browserbase
+        self.project_id = os.environ["BROWSERBASE_PROJECT_ID"]
+        self.bb = Browserbase(api_key=os.environ["BROWSERBASE_API_KEY"])
+        self._contexts_path = os.path.join(DATA_DIR, "browserbase_contexts.json")
+        self._contexts = {}
+        if os.path.exists(self._contexts_path):
+            with open(self._contexts_path) as f:
+                self._contexts = json.load(f)
+        self._lock = threading.Lock()
+
+    def _context_id(self, user_key):
+        """The user's Browserbase context, created the first time the user browses"""
+        with self._lock:
+            if user_key not in self._contexts:
+                self._contexts[user_key] = self.bb.contexts.create(project_id=self.project_id).id
+                os.makedirs(DATA_DIR, exist_ok=True)
+                with open(self._contexts_path, "w") as f:
+                    json.dump(self._contexts, f)
+            return self._contexts[user_key]
+
+    def has_profile(self, user_key):
+        return user_key in self._contexts
+
+    def create(self, user_key=None):
+        options = {"project_id": self.project_id, "proxies": True, "keep_alive": True}
+        if user_key is not None:
+            options["browser_settings"] = {"context": {"id": self._context_id(user_key), "persist": True}}
+        session = self.bb.sessions.create(**options)
+        debug_url = self.bb.sessions.debug(session.id).debugger_fullscreen_url
+        return BrowserSession(session.id, session.connect_url, debug_url, user_key)
+
+    def is_alive(self, session):
+        return self.bb.sessions.retrieve(session.id).status == "RUNNING"
+
+    def close(self, session):
+        self.bb.sessions.update(session.id, project_id=self.project_id, status="REQUEST_RELEASE")
+
+
+class LocalChromiumBackend:
+    """Chromium processes on this machine, each with a remote debugging port and a per-user profile directory"""
+    name = "local"
+    adopts_warm_sessions = True  # a warm session's profile directory becomes the user's when it is closed
+
+    def __init__(self, executable=None, headless=True):
+        self.executable = executable or os.getenv("CHROMIUM_PATH") or self._find_chromium()
+        self.headless = headless
+        self.profiles_dir = os.path.join(DATA_DIR, "browser_profiles")
+
+    def _find_chromium(self):
+        for name in ("chromium", "chromium-browser", "google-chrome", "google-chrome-stable", "chrome"):
+            path = shutil.which(name)
+            if path:
+                return path
+        try:
+            # Fall back to the Chromium that Playwright installs
+            from playwright.sync_api import sync_playwright
+            with sync_playwright() as playwright:
+                return playwright.chromium.executable_path
+        except Exception:
+            raise RuntimeError("No Chromium found; install one or set CHROMIUM_PATH")
+
+    def _profile(self, user_key):
+        return os.path.join(self.profiles_dir, re.sub(r"[^\w.-]", "_", user_key))
+
+    def has_profile(self, user_key):
+        return os.path.isdir(self._profile(user_key))
+
+    def create(self, user_key=None):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        profile = self._profile(user_key) if user_key is not None else os.path.join(self.profiles_dir, f"warm-{port}")
+        args = [self.executable, f"--remote-debugging-port={port}", f"--user-data-dir={profile}",
+                "--no-first-run", "--no-default-browser-check", "about:blank"]
+        if self.headless:
+            args.insert(1, "--headless=new")
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        endpoint = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 20
+        while time.time() < deadline:
+            if self._responds(endpoint):
+                return BrowserSession(f"local-{port}", endpoint, None, user_key, handle=(process, profile))
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        process.kill()
+        raise RuntimeError(f"Chromium did not start on port {port}")
+
+    def _responds(self, endpoint):
+        try:
+            with urllib.request.urlopen(f"{endpoint}/json/version", timeout=1) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def is_alive(self, session):
+        process, _ = session.handle
+        return process.poll() is None and self._responds(session.connect_url)
+
+    def close(self, session):
+        process, profile = session.handle
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        # A warm session handed to a user keeps its profile as theirs, so cookies and logins persist; unused ones are dropped
+        if session.user_key is not None and profile == self._profile(session.user_key):
+            return
+        if session.user_key is not None and not self.has_profile(session.user_key):
+            os.replace(profile, self._profile(session.user_key))
+        else:
+            shutil.rmtree(profile, ignore_errors=True)
+
+
+BACKENDS = {
+    "browserbase": BrowserbaseBackend,
+    "local": LocalChromiumBackend,
+}
+
+
+class BrowserSessionPool:
+    def __init__(self, backend, max_size=BROWSER_POOL_SIZE, warm_sessions=BROWSER_WARM_SESSIONS, idle_timeout=BROWSER_IDLE_TIMEOUT):
+        self.backend = backend
+        self.max_size = max_size
+        self.warm_sessions = warm_sessions
+        self.idle_timeout = idle_timeout
+        self.stats = {"created": 0, "reused": 0, "warm_hits": 0, "closed": 0, "unhealthy": 0}
+        self._sessions = []
+        self._creating = 0  # sessions being created right now, counted against max_size
+        self._changed = threading.Condition()
+        self._stopped = threading.Event()
+
+        self._maintenance_thread = threading.Thread(target=self._maintenance_loop, daemon=True)
+        self._maintenance_thread.start()
+
+    def acquire(self, user_key, timeout=BROWSER_ACQUIRE_TIMEOUT):
+        """
+        A healthy session for the user, reusing their idle one or a warm one when possible. With user_key None the session
+        is a throwaway one that is bound to nobody; give it back with discard() rather than release()
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self._changed:
+                session = self._pick(user_key)
+                if session is None and self._has_room():
+                    self._creating += 1
+                elif session is None:
+                    # Every session is busy; wait for one to be released
+                    if not self._changed.wait(max(0, deadline - time.time())) and time.time() >= deadline:
+                        raise TimeoutError(f"No browser session became available within {timeout}s")
+                    continue
+                else:
+                    session.in_use = True
+
+            if session is None:
+                return self._create(user_key, in_use=True)
+            if self._healthy(session):
+                session.last_used = time.time()
+                return session
+
+    def release(self, session):
+        """Give a session back to the pool; it stays bound to its user until it idles out"""
+        with self._changed:
+            session.in_use = False
+            session.last_used = time.time()
+            self._changed.notify_all()
+
+    def discard(self, session):
+        """Close a session that should not be reused, e.g. after its browser crashed"""
+        with self._changed:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            self._changed.notify_all()
+        self._close(session)
+
+    def prewarm(self, user_key):
+        """Start a session for a user in the background, so their first browse action does not wait for it"""
+        def warm():
+            with self._changed:
+                if any(session.user_key == user_key for session in self._sessions) or not self._has_room():
+                    return
+                self._creating += 1
+            try:
+                self._create(user_key, in_use=False)
+            except Exception as e:
+                print(f"Error pre-warming browser session for {user_key}: {e}")
+        threading.Thread(target=warm, daemon=True).start()
+
+    def close(self):
+        self._stopped.set()
+        with self._changed:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            self._close(session)
+
+    def _pick(self, user_key):
+        """
+        An idle session of the user, or a warm unassigned one for a throwaway task or, if the backend can adopt it as their
+        profile, for a user with no profile to restore. Called with the lock held
+        """
+        for session in self._sessions:
+            if user_key is not None and session.user_key == user_key and not session.in_use:
+                self.stats["reused"] += 1
+                return session
+        if user_key is None or (self.backend.adopts_warm_sessions and not self.backend.has_profile(user_key)):
+            for session in self._sessions:
+                if session.user_key is None and not session.in_use:
+                    session.user_key = user_key
+                    self.stats["warm_hits"] += 1
+                    return session
+        # Make room for a new session by closing the least recently used idle one
+        if not self._has_room():
+            idle = [session for session in self._sessions if not session.in_use]
+            if idle:
+                victim = min(idle, key=lambda session: session.last_used)
+                self._sessions.remove(victim)
+                threading.Thread(target=self._close, args=(victim,), daemon=True).start()
+        return None
+
+    def _has_room(self):
+        return len(self._sessions) + self._creating < self.max_size
+
+    def _create(self, user_key, in_use):
+        """Create a session; the caller has already reserved a slot in _creating"""
+        try:
+            session = self.backend.create(user_key)
+        except Exception:
+            with self._changed:
+                self._creating -= 1
+                self._changed.notify_all()
+            raise
+        session.in_use = in_use
+        with self._changed:
+            self._creating -= 1
+            self._sessions.append(session)
+            self.stats["created"] += 1
+            self._changed.notify_all()
+        print(f"Created browser session {session.id} for {user_key or 'the warm pool'} ({len(self._sessions)} live)")
+        return session
+
+    def _healthy(self, session):
+        try:
+            if self.backend.is_alive(session):
+                return True
+        except Exception as e:
+            print(f"Health check of browser session {session.id} failed: {e}")
+        self.stats["unhealthy"] += 1
+        self.discard(session)
+        return False
+
+    def _close(self, session):
+        try:
+            self.backend.close(session)
+        except Exception as e:
+            print(f"Error closing browser session {session.id}: {e}")
+        self.stats["closed"] += 1
+
+    def _maintenance_loop(self):
+        """Close idle and dead sessions and keep the warm sessions topped up"""
+        while not self._stopped.wait(HEALTH_CHECK_INTERVAL):
+            try:
+                self.maintain()
+            except Exception as e:
+                print(f"Error maintaining browser sessions: {e}")
+
+    def maintain(self):
+        now = time.time()
+        with self._changed:
+            idle = [session for session in self._sessions if not session.in_use]
+            expired = [session for session in idle if session.user_key is not None and now - session.last_used > self.idle_timeout]
+            for session in expired:
+                self._sessions.remove(session)
+            # Checked sessions are marked in use so they are not handed out halfway through the check
+            checked = [session for session in idle if session not in expired]
+            for session in checked:
+                session.in_use = True
+        for session in expired:
+            print(f"Closing browser session {session.id}, idle for {now - session.last_used:.0f}s")
+            self._close(session)
+        for session in checked:
+            if self._healthy(session):
+                with self._changed:
+                    session.in_use = False
+                    self._changed.notify_all()
+
+        with self._changed:
+            missing = self.warm_sessions - sum(1 for session in self._sessions if session.user_key is None and not session.in_use) - self._creating
+            missing = min(missing, self.max_size - len(self._sessions) - self._creating)
+            self._creating += max(0, missing)
+        for _ in range(max(0, missing)):
+            try:
+                self._create(None, in_use=False)
+            except Exception as e:
+                print(f"Error warming a browser session: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """The process-wide session pool, created on first use with the BROWSER_BACKEND backend"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserSessionPool(BACKENDS[BROWSER_BACKEND]())
+            # Warm the first sessions right away rather than at the first health check
+            threading.Thread(target=_pool.maintain, daemon=True).start()
+        return _pool
@@ -11,6 +11,8 @@ import io
 import time
 import json
 import asyncio
+from helper_functions import use_deepseek
+from browsing.html_chunker import strip_noise, chunk_html, find_in_chunks
 
 load_dotenv()
 
@@ -37,33 +39,7 @@ def locate_element(element_to_locate, page):
     except:
         pass
 
-    html = page.content()
-
-    # Chunk HTML into sections of 20000 characters
-    chunk_size = 20000
-    html_chunks = []
-    
-    # Split HTML into chunks while preserving tag structure
-    current_chunk = ""
-    buffer = ""
-    
-    for char in html:
-        buffer += char
-        
-        if char == '>':
-            if len(current_chunk) + len(buffer) >= chunk_size:
-                html_chunks.append(current_chunk)
-                current_chunk = buffer
-            else:
-                current_chunk += buffer
-            buffer = ""
-                
-    # Add final chunk
-    if current_chunk or buffer:
-        html_chunks.append(current_chunk + buffer)
-
-
-    for chunk in html_chunks:
+    def ask(chunk):
         prompt = f"""
         You are an LLM that can parse HTML and find the element that matches the description given to you.
 
@@ -103,20 +79,29 @@ def locate_element(element_to_locate, page):
 
         print("Element data: ", element_data)
 
-        if (element_data["element"] == "NA" and element_data["id"] == "NA" and element_data["placeholder"] == "NA" and element_data["label"] == "NA" and element_data["text"] == "NA"):
+        fields = ["element", "id", "label", "placeholder", "text"]
+        if all(element_data.get(field, "NA") == "NA" for field in fields):
             # The element is absolutely not in this chunk
-            continue
-
-        if (element_data["id"] != "NA"):
-            element = page.locator(f'id={element_data["id"]}').first
-        if (element_data["placeholder"] != "NA"):
-            element = page.get_by_placeholder(element_data['placeholder']).first
-        elif (element_data["label"] != "NA"):
-            element = page.get_by_label(element_data['label']).first
-        elif (element_data["text"] != "NA"):
-            element = page.get_by_text(element_data['text']).first
-
-        return element
+            return None
+        return element_data
+
+    # The chunks that best match the element's words are sent to the LLM first, several at a time
+    html_chunks = chunk_html(strip_noise(page.content()))
+    element_data = find_in_chunks(element_to_locate, html_chunks, ask)
+    if element_data is None:
+        return None
+
+    element = None
+    if (element_data.get("id", "NA") != "NA"):
+        element = page.locator(f'id={element_data["id"]}').first
+    if (element_data.get("placeholder", "NA") != "NA"):
+        element = page.get_by_placeholder(element_data['placeholder']).first
+    elif (element_data.get("label", "NA") != "NA"):
+        element = page.get_by_label(element_data['label']).first
+    elif (element_data.get("text", "NA") != "NA"):
+        element = page.get_by_text(element_data['text']).first
+
+    return element
 
 def run(playwright: Playwright) -> None:
     """Run browser automation session using Playwright and Browserbase."""
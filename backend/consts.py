@@ -1,2 +1,26 @@
+import os
+
 SIMILARITY_THRESHOLD = 0.5;
-IDENTITY_THRESHOLD = 0.75;
\ No newline at end of file
+IDENTITY_THRESHOLD = 0.75;
+
+# Working memory rendering
+WORKING_MEMORY_TOKEN_BUDGET = int(os.getenv("WORKING_MEMORY_TOKEN_BUDGET", 12000)); # rough token budget for the rendered working memory
+HISTORY_WINDOW = 10; # newest conversation entries shown verbatim, older ones are summarized
+HISTORY_SUMMARY_BATCH = 6; # number of entries folded into the rolling summary at once
+RECENT_ENTRIES_WINDOW = 25; # newest observations and actions shown
+INFO_DUMP_MAX_CHARS = int(os.getenv("INFO_DUMP_MAX_CHARS", 16000)); # info dump shown in the prompt
+INFO_BUFFER_CAPACITY_CHARS = int(os.getenv("INFO_BUFFER_CAPACITY_CHARS", 200000)); # info dump kept in memory, oldest entries evicted first
+
+# Knowledge segmentation
+SEGMENTATION_CHUNK_CHARS = int(os.getenv("SEGMENTATION_CHUNK_CHARS", 12000)); # roughly 3000 tokens of input per segmentation call
+SEGMENTATION_CONCURRENCY = int(os.getenv("SEGMENTATION_CONCURRENCY", 4));
+SEGMENTATION_MAX_TOKENS = 4096;
+SEGMENTATION_DEADLINE = float(os.getenv("SEGMENTATION_DEADLINE", 600)); # seconds per segmentation stream, retries included; the default LLM deadline is sized for shorter replies
+KNOWLEDGE_BATCH_SIZE = 8; # streamed segments are encoded and published in groups of up to this many
+KNOWLEDGE_BATCH_SECONDS = 1.0; # or once the oldest waiting segment is this old
+KNOWLEDGE_WAIT_SEGMENTS = int(os.getenv("KNOWLEDGE_WAIT_SEGMENTS", 3)); # segments a search waits for before the decision loop continues
+KNOWLEDGE_WAIT_TIMEOUT = float(os.getenv("KNOWLEDGE_WAIT_TIMEOUT", 20)); # seconds
+
+LONG_TERM_MEMORY_DIR = os.getenv("LONG_TERM_MEMORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "long_term_memory"));
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "search_cache.sqlite3"));
@@ -0,0 +1,81 @@
+"""
+A single background asyncio event loop shared by the whole process.
+
+Most of the backend runs on plain threads (socket handlers, decision loops, search threads). Async clients with pooled
+connections are bound to the loop that created them, so they all live on this one loop and synchronous code reaches
+them through run_sync / iterate_sync.
+"""
+
+import asyncio
+import queue
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on the first call"""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def in_loop_thread():
+    """Whether the caller is running on the shared loop itself"""
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the shared loop and block the calling thread until it finishes"""
+    if in_loop_thread():
+        raise RuntimeError("run_sync would deadlock when called from the shared event loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def run_on_loop(coro):
+    """Await a coroutine on the shared loop from any event loop"""
+    if in_loop_thread():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_loop()))
+
+
+def iterate_sync(async_iterable):
+    """Consume an async iterable on the shared loop as a regular generator; closing the generator cancels the producer"""
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put((item, None))
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+            raise
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None and not isinstance(error, asyncio.CancelledError):
+                    raise error
+                return
+            yield item
+    finally:
+        if not future.done():
+            future.cancel()
@@ -0,0 +1,68 @@
+"""
+Shared embedding model for every module that needs sentence embeddings.
+
+The SentenceTransformer is loaded on first use rather than at import time, and only one copy of its weights is kept per process.
+The model, device and CPU thread count can be picked with configure() before the first encode, or through the
+EMBEDDING_MODEL, EMBEDDING_DEVICE and EMBEDDING_THREADS environment variables.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODEL_NAME = "all-mpnet-base-v2"
+
+_settings = {
+    "model_name": os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL_NAME),
+    "device": os.getenv("EMBEDDING_DEVICE") or None,  # None lets sentence-transformers pick
+    "num_threads": int(os.getenv("EMBEDDING_THREADS")) if os.getenv("EMBEDDING_THREADS") else None,
+}
+_model = None
+_lock = threading.Lock()
+
+
+def configure(model_name=None, device=None, num_threads=None):
+    """Choose the model, device and torch thread count; must be called before the model is first used"""
+    with _lock:
+        if _model is not None:
+            raise RuntimeError("The embedding model has already been loaded; configure it before the first encode")
+        if model_name is not None:
+            _settings["model_name"] = model_name
+        if device is not None:
+            _settings["device"] = device
+        if num_threads is not None:
+            _settings["num_threads"] = num_threads
+
+
+def get_model():
+    """Return the shared SentenceTransformer, loading it on the first call"""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+
+                if _settings["num_threads"]:
+                    import torch
+                    torch.set_num_threads(_settings["num_threads"])
+
+                print(f"Loading embedding model {_settings['model_name']} on {_settings['device'] or 'default device'}")
+                _model = SentenceTransformer(_settings["model_name"], device=_settings["device"])
+    return _model
+
+
+def is_loaded():
+    """Whether the shared model has been loaded yet"""
+    return _model is not None
+
+
+def encode(text, **kwargs):
+    """Embed a single string, returning a 1-d numpy array"""
+    return get_model().encode(text, **kwargs)
+
+
+def encode_batch(texts, batch_size=32, **kwargs):
+    """Embed a list of strings in batched forward passes, returning a 2-d numpy array with one row per string"""
+    return get_model().encode(list(texts), batch_size=batch_size, **kwargs)
@@ -0,0 +1,282 @@
+"""
+Incremental parsing of JSON that arrives in pieces, e.g. the input_json_delta chunks of a streamed tool call or the
+text of a streamed LLM response, and of JSON that was cut off before it was finished.
+"""
+
+import json
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StringFieldStream:
+    """Pulls the value of one top-level string field out of a JSON object while the object is still being streamed.
+
+    feed() takes the next raw chunk and returns the newly decoded characters of the field (escapes resolved), so the
+    field can be shown as it is generated, long before the object is complete enough for json.loads.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.value = ""
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._expect_key = False
+        self._in_field = False
+        self._escape = None  # None, or the characters of an escape sequence read so far (after the backslash)
+        self._high_surrogate = None
+        self._key = []
+        self._last_key = None
+
+    def feed(self, chunk):
+        """Consume the next chunk of raw JSON and return the field's newly decoded text"""
+        decoded = []
+        for char in chunk:
+            if self._in_string:
+                self._string_char(char, decoded)
+            elif char == '"':
+                self._in_string = True
+                self._is_key = self._depth == 1 and self._expect_key
+                self._in_field = self._depth == 1 and not self._is_key and self._last_key == self.field and not self.complete
+                self._key = []
+            elif char in "{[":
+                self._depth += 1
+                self._expect_key = char == "{"
+            elif char in "}]":
+                self._depth -= 1
+            elif char == "," and self._depth == 1:
+                self._expect_key = True
+            elif char == ":" and self._depth == 1:
+                self._expect_key = False
+
+        text = "".join(decoded)
+        self.value += text
+        return text
+
+    def _string_char(self, char, decoded):
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                self._emit(self._code_point(int(self._escape[1:], 16)), decoded)
+            else:
+                self._emit(ESCAPES.get(char, char), decoded)
+            self._escape = None
+        elif char == "\\":
+            self._escape = ""
+        elif char == '"':
+            self._in_string = False
+            if self._is_key:
+                self._last_key = "".join(self._key)
+            elif self._in_field:
+                self._in_field = False
+                self.complete = True
+        else:
+            self._emit(char, decoded)
+
+    def _code_point(self, code):
+        """Combine UTF-16 surrogate pairs from consecutive \\u escapes"""
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _emit(self, text, decoded):
+        if self._is_key:
+            self._key.append(text)
+        elif self._in_field:
+            decoded.append(text)
+
+
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class SegmentStream:
+    """Recovers complete segments from a JSON object as it streams in, or from output that was cut off.
+
+    Without items_of, every top-level member of the object is a segment and feed() returns (key, value) pairs. With
+    items_of, the elements of the array under that key are the segments and feed() returns the values. Each segment is
+    parsed on its own, so a malformed or truncated segment only loses itself: finish() salvages the complete part of a
+    member cut off mid-way (e.g. the full sentences of a truncated list). Text before the object is skipped, after the
+    start_after marker if one is given, and an object that yields nothing (a stray brace in the model's reasoning) is
+    dropped in favour of the next one.
+    """
+
+    def __init__(self, items_of=None, start_after=None):
+        self.items_of = items_of
+        self.start_after = start_after
+        self.segments = []
+        self.complete = False
+        self._preamble = []  # text seen before the marker, rescanned by finish() if the marker never shows up
+        self._marker_tail = ""
+        self._reset_object()
+
+    def _reset_object(self):
+        self._started = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._member = []
+        self._member_safe = None  # (length, closing brackets) of the last point the member can be cut and closed
+        self._key = None
+        self._item = None  # raw characters of the current array element in items_of mode, None outside the array
+        self._object_segments = 0
+
+    def feed(self, chunk):
+        """Consume the next chunk of raw text and return the segments it completed"""
+        new_segments = []
+        if self.start_after is not None:
+            self._preamble.append(chunk)
+            window = self._marker_tail + chunk
+            index = window.find(self.start_after)
+            if index == -1:
+                self._marker_tail = window[-len(self.start_after):]
+                return new_segments
+            chunk = window[index + len(self.start_after):]
+            self.start_after = None
+            self._preamble = []
+        for char in chunk:
+            if not self.complete:
+                self._char(char, new_segments)
+        return new_segments
+
+    def finish(self):
+        """Call once the output has ended. Returns the segments salvaged from a truncated end"""
+        if self.start_after is not None:
+            # The marker never came, so look for the object in everything that was seen
+            preamble = "".join(self._preamble)
+            self.start_after = None
+            self._preamble = []
+            new_segments = self.feed(preamble)
+            return new_segments + self.finish()
+
+        new_segments = []
+        if self.complete or not self._started:
+            return new_segments
+        if self.items_of is None and self._member_safe and self._key is not None:
+            length, closers = self._member_safe
+            self._emit_member("".join(self._member[:length]) + closers, new_segments)
+        self.complete = True
+        return new_segments
+
+    def _char(self, char, new_segments):
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._stack = ["{"]
+            return
+
+        if self._in_string:
+            self._append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._stack[-1] == "[":
+                    self._mark_safe(len(self._member))
+            return
+
+        depth = len(self._stack)
+        if char == '"':
+            self._in_string = True
+            self._append(char)
+        elif char in "{[":
+            self._append(char)
+            self._stack.append(char)
+            if depth == 1 and char == "[" and self.items_of is not None and self._key == self.items_of:
+                self._item = []
+        elif char in "}]":
+            if depth == 1:
+                self._end_member(new_segments)
+                self._end_object()
+                return
+            if depth == 2 and self._item is not None:
+                self._emit_item(new_segments)
+                self._item = None
+            self._stack.pop()
+            self._append(char)
+            self._mark_safe(len(self._member))
+        elif char == "," and depth == 1:
+            self._end_member(new_segments)
+        elif char == "," and depth == 2 and self._item is not None:
+            self._mark_safe(len(self._member))
+            self._append_member(char)
+            self._emit_item(new_segments)
+        elif char == ",":
+            self._mark_safe(len(self._member))
+            self._append(char)
+        elif char == ":" and depth == 1:
+            try:
+                self._key = json.loads("".join(self._member))
+            except ValueError:
+                self._key = None
+            self._append(char)
+        else:
+            self._append(char)
+
+    def _append(self, char):
+        self._member.append(char)
+        if self._item is not None:
+            self._item.append(char)
+
+    def _append_member(self, char):
+        self._member.append(char)
+
+    def _mark_safe(self, length):
+        if len(self._stack) >= 2:
+            self._member_safe = (length, "".join(CLOSERS[bracket] for bracket in reversed(self._stack[1:])))
+
+    def _end_member(self, new_segments):
+        if self.items_of is None:
+            self._emit_member("".join(self._member), new_segments)
+        self._member = []
+        self._member_safe = None
+        self._key = None
+
+    def _end_object(self):
+        if self._object_segments:
+            self.complete = True
+        else:
+            # Nothing usable in this object, so keep looking for the real one
+            self._reset_object()
+
+    def _emit_member(self, raw, new_segments):
+        if not raw.strip():
+            return
+        try:
+            member = json.loads("{" + raw + "}")
+        except ValueError as e:
+            print(f"Skipping malformed JSON segment: {e}")
+            return
+        for key, value in member.items():
+            self._add((key, value), new_segments)
+
+    def _emit_item(self, new_segments):
+        raw = "".join(self._item)
+        self._item = []
+        if not raw.strip():
+            return
+        try:
+            self._add(json.loads(raw), new_segments)
+        except ValueError as e:
+            print(f"Skipping malformed JSON item: {e}")
+
+    def _add(self, segment, new_segments):
+        self._object_segments += 1
+        self.segments.append(segment)
+        new_segments.append(segment)
+
+
+def parse_segments(text, items_of=None, start_after=None):
+    """Every segment that can be recovered from a complete or truncated JSON response"""
+    stream = SegmentStream(items_of, start_after)
+    stream.feed(text)
+    stream.finish()
+    return stream.segments
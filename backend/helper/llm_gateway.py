@@ -0,0 +1,168 @@
+"""
+One gateway for every LLM call the backend makes.
+
+- each provider has a single async client on the shared event loop, so HTTP connections are pooled across all agents
+- a per-provider semaphore bounds how many requests are in flight at once
+- 429, 5xx/overloaded responses, connection errors and timeouts are retried with jittered exponential backoff,
+  honouring Retry-After when the provider sends it
+- every attempt has a timeout and every call has an overall deadline that covers its retries
+
+Async callers await LLMGateway.claude / claude_stream / deepseek; synchronous callers go through the *_sync shims,
+which is what helper_functions uses.
+"""
+
+import os
+import asyncio
+import random
+import time
+import httpx
+import anthropic
+import openai
+from dotenv import load_dotenv
+from helper.async_loop import run_on_loop, run_sync, iterate_sync
+
+load_dotenv()
+
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))  # seconds per attempt
+DEADLINE = float(os.getenv("LLM_DEADLINE", 180))  # seconds per call, retries included
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 16.0
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+
+PROVIDER_CONCURRENCY = {
+    "anthropic": int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", 8)),
+    "deepseek": int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", 8)),
+}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error):
+    """Whether an SDK error is worth retrying: rate limits, overloads, server errors, dropped connections and timeouts"""
+    if isinstance(error, (anthropic.APIConnectionError, openai.APIConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS or (status is not None and status >= 500)
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before the next attempt: the provider's Retry-After if given, otherwise full-jitter backoff"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_CAP)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class LLMGateway:
+    def __init__(self, request_timeout=REQUEST_TIMEOUT, deadline=DEADLINE, max_retries=MAX_RETRIES, concurrency=None):
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.concurrency = dict(PROVIDER_CONCURRENCY, **(concurrency or {}))
+        # Built lazily on the shared loop, since async clients and semaphores belong to the loop that created them
+        self._http_client = None
+        self._clients = {}
+        self._semaphores = {}
+
+    def _http(self):
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.request_timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+        return self._http_client
+
+    def _client(self, provider):
+        if provider not in self._clients:
+            if provider == "anthropic":
+                self._clients[provider] = anthropic.AsyncAnthropic(
+                    api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=self._http(), max_retries=0)
+            elif provider == "deepseek":
+                self._clients[provider] = openai.AsyncOpenAI(
+                    api_key=os.getenv("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com", http_client=self._http(), max_retries=0)
+            else:
+                raise ValueError(f"Unknown LLM provider: {provider}")
+        return self._clients[provider]
+
+    def _semaphore(self, provider):
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.concurrency.get(provider, 8))
+        return self._semaphores[provider]
+
+    async def _with_retries(self, provider, request, deadline):
+        """Run request(client) under the provider's semaphore, retrying transient failures until the deadline"""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            try:
+                async with asyncio.timeout_at(asyncio.get_running_loop().time() + max(0.0, deadline_at - time.monotonic())):
+                    async with self._semaphore(provider):
+                        return await request(self._client(provider))
+            except Exception as e:
+                if isinstance(e, TimeoutError) and time.monotonic() >= deadline_at:
+                    raise TimeoutError(f"{provider} call exceeded its {deadline or self.deadline:g}s deadline") from e
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt)
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                print(f"{provider} call failed ({e.__class__.__name__}: {e}), retrying in {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def claude(self, message_params, deadline=None):
+        """Create an Anthropic message"""
+        async def request(client):
+            return await client.messages.create(**message_params)
+        return await run_on_loop(self._with_retries("anthropic", request, deadline))
+
+    async def claude_stream(self, message_params, deadline=None):
+        """Stream the events of an Anthropic message. A failure is only retried if nothing has been yielded yet"""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            yielded = False
+            try:
+                async with asyncio.timeout_at(asyncio.get_running_loop().time() + max(0.0, deadline_at - time.monotonic())):
+                    async with self._semaphore("anthropic"):
+                        async with self._client("anthropic").messages.stream(**message_params) as stream:
+                            async for event in stream:
+                                yielded = True
+                                yield event
+                return
+            except Exception as e:
+                if isinstance(e, TimeoutError) and time.monotonic() >= deadline_at:
+                    raise TimeoutError(f"anthropic stream exceeded its {deadline or self.deadline:g}s deadline") from e
+                if yielded or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt)
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                print(f"anthropic stream failed ({e.__class__.__name__}: {e}), retrying in {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def deepseek(self, messages, model="deepseek-chat", deadline=None):
+        """Create a DeepSeek chat completion"""
+        async def request(client):
+            return await client.chat.completions.create(model=model, messages=messages, stream=False)
+        return await run_on_loop(self._with_retries("deepseek", request, deadline))
+
+    # Synchronous shims for the threaded parts of the backend
+
+    def claude_sync(self, message_params, deadline=None):
+        return run_sync(self.claude(message_params, deadline))
+
+    def claude_stream_sync(self, message_params, deadline=None):
+        return iterate_sync(self.claude_stream(message_params, deadline))
+
+    def deepseek_sync(self, messages, model="deepseek-chat", deadline=None):
+        return run_sync(self.deepseek(messages, model, deadline))
+
+
+gateway = LLMGateway()
@@ -1,9 +1,11 @@
 import re
-import anthropic
 import os
 from postmarker.core import PostmarkClient
 from dotenv import load_dotenv
-from openai import OpenAI
+from helper.llm_gateway import gateway
+from helper.json_stream import StringFieldStream
+import json
+import uuid
 
 load_dotenv()
 
@@ -174,12 +176,18 @@ def process_images(images):
             })
     return processed_images
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+HAIKU_MODEL = "claude-3-5-haiku-20241022"
+SONNET_MODEL = "claude-3-5-sonnet-20240620"
 
-def use_claude(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[], sonnet=False):
+def build_message_params(user_prompt, system_prompt=None, temperature=1, tools=[], images=[], model=HAIKU_MODEL, max_tokens=1024, cache_prefix=False):
+    """Build the Anthropic messages.create parameters for a single user turn, with the images placed before the prompt.
+
+    With cache_prefix, a prompt cache breakpoint is placed at the end of the system prompt, so the tools and the system
+    prompt (which come before the messages) are cached as one stable prefix; only the user turn is billed at the full rate.
+    """
     message_params = {
-        "model": "claude-3-5-sonnet-20240620" if sonnet else "claude-3-5-haiku-20241022",
-        "max_tokens": 1024,
+        "model": model,
+        "max_tokens": max_tokens,
         "temperature": temperature,
         "messages": [
             {
@@ -190,7 +198,10 @@ def use_claude(user_prompt, system_prompt=None, temperature=1, json=False, tools
     }
     
     if system_prompt is not None:
-        message_params["system"] = system_prompt
+        if cache_prefix:
+            message_params["system"] = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        else:
+            message_params["system"] = system_prompt
 
     if tools is not None and len(tools) > 0:
         message_params["tools"] = tools
@@ -205,56 +216,41 @@ def use_claude(user_prompt, system_prompt=None, temperature=1, json=False, tools
 
     content.append({"type": "text", "text": user_prompt})
     message_params["messages"][0]["content"] = content
+
+    return message_params
+
+def use_claude(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[], sonnet=False, max_tokens=1024):
+    message_params = build_message_params(user_prompt, system_prompt, temperature, tools, images, model=SONNET_MODEL if sonnet else HAIKU_MODEL, max_tokens=max_tokens)
     
-    message = client.messages.create(**message_params)
+    message = gateway.claude_sync(message_params)
 
     return message.content[0].text
 
-ds_client = OpenAI(api_key=os.getenv("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com")
 def use_deepseek(prompt):
     
-    response = ds_client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "user", "content": prompt},
-        ],
-        stream=False
-    )
+    response = gateway.deepseek_sync([
+        {"role": "user", "content": prompt},
+    ])
 
     return response.choices[0].message.content
 
 
-def use_claude_tools(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[], stream=False):
-    message_params = {
-        # "model": "claude-3-5-haiku-20241022",
-        "model": "claude-3-5-sonnet-20240620",
-        "max_tokens": 1024,
-        "temperature": temperature,
-        "messages": [
-            {
-                "role": "user",
-                "content": []
-            }
-        ],
-        "tools": tools,
+def usage_to_dict(usage):
+    """Token usage of a message, including prompt cache reads and writes"""
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
     }
-    
-    if system_prompt is not None:
-        message_params["system"] = system_prompt
 
-    content = []
-    if images and len(images) > 0:
-        processed_images = process_images(images)
-        for i, image_data in enumerate(processed_images):
-            content.append(image_data["image"])
-            if image_data["text"]:
-                content.append({"type": "text", "text": f"Description for Image {i+1}: {image_data['text']}"})
-
-    content.append({"type": "text", "text": user_prompt})
-    message_params["messages"][0]["content"] = content
+def use_claude_tools(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[], stream=False, on_reply_delta=None, cache_prefix=False):
+    message_params = build_message_params(user_prompt, system_prompt, temperature, tools, images, model=SONNET_MODEL, cache_prefix=cache_prefix)
 
+    if stream:
+        return stream_claude_tools(message_params, on_reply_delta)
 
-    message = client.messages.create(**message_params)
+    message = gateway.claude_sync(message_params)
 
     print("MESSAGE: ", message, "with prompt: ", user_prompt)
 
@@ -263,58 +259,74 @@ def use_claude_tools(user_prompt, system_prompt=None, temperature=1, json=False,
             response = {
                 "tool": content_block.name,
                 "input": content_block.input,
+                "usage": usage_to_dict(message.usage),
             }
 
     print("RESPONSE: ", response)
 
     return response
 
-    # if stream:
-    #     print("STREAMING MESSAGE PARAMS: ", message_params)
-    #     with client.messages.stream(**message_params) as stream:
-    #         for message in stream:
-    #             yield message
-    # else:
-    #     print("MESSAGE PARAMS: ", message_params)
-        
-
-    
-
-def use_claude_stream(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[]):
-    message_params = {
-        "model": "claude-3-5-haiku-20241022",
-        "max_tokens": 1024,
-        "temperature": temperature,
-        "messages": [
-            {
-                "role": "user",
-                "content": []
+def stream_claude_tools(message_params, on_reply_delta=None):
+    """Stream a tool-use call, decoding the reply tool's message as it arrives.
+
+    on_reply_delta(text, stream_id) receives the reply text decoded so far every time a new piece of it arrives, with an
+    id that is new for every reply so the frontend can tell a new reply from the next piece of the current one.
+    Returns the final action dict, like use_claude_tools, with "streamed" and "stream_id" set if the reply was forwarded
+    while streaming and "usage" holding the token usage of the call.
+    """
+    response = None
+    tool_used = None
+    input_parts = []
+    reply_stream = None
+    stream_id = None
+    streamed = False
+    usage = None
+
+    for event in gateway.claude_stream_sync(message_params):
+        if event.type == "message_start":
+            usage = usage_to_dict(event.message.usage)
+
+        elif event.type == "message_delta" and usage is not None:
+            usage["output_tokens"] = event.usage.output_tokens
+
+        elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+            tool_used = event.content_block.name
+            input_parts = []
+            reply_stream = StringFieldStream("message") if tool_used == "reply" else None
+            stream_id = uuid.uuid4().hex if tool_used == "reply" else None
+            print("TOOL USED: ", tool_used)
+
+        elif event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+            input_parts.append(event.delta.partial_json)
+            if reply_stream is not None and reply_stream.feed(event.delta.partial_json) and on_reply_delta:
+                on_reply_delta(reply_stream.value.replace("<wait>", ""), stream_id)
+                streamed = True
+
+        elif event.type == "content_block_stop" and tool_used is not None:
+            full_input = "".join(input_parts)
+            response = {
+                "tool": tool_used,
+                "input": json.loads(full_input) if full_input else {},
+                "streamed": streamed,
+                "stream_id": stream_id,
             }
-        ],
-    }
-    
-    if system_prompt is not None:
-        message_params["system"] = system_prompt
+            tool_used = None
+            reply_stream = None
 
-    if tools is not None and len(tools) > 0:
-        message_params["tools"] = tools
+    if response is not None:
+        response["usage"] = usage
 
-    content = []
-    if images and len(images) > 0:
-        processed_images = process_images(images)
-        for i, image_data in enumerate(processed_images):
-            content.append(image_data["image"])
-            if image_data["text"]:
-                content.append({"type": "text", "text": f"Description for Image {i+1}: {image_data['text']}"})
+    print("RESPONSE: ", response)
 
-    content.append({"type": "text", "text": user_prompt})
-    message_params["messages"][0]["content"] = content
+    return response
+
+def use_claude_stream(user_prompt, system_prompt=None, temperature=1, json=False, tools=[], images=[], max_tokens=1024, deadline=None):
+    message_params = build_message_params(user_prompt, system_prompt, temperature, tools, images, model=HAIKU_MODEL, max_tokens=max_tokens)
     
-    with client.messages.stream(**message_params) as stream:
-        for message in stream:
+    for message in gateway.claude_stream_sync(message_params, deadline):
 
-            if message.type == "content_block_delta":
-                yield message.delta.text
+        if message.type == "content_block_delta":
+            yield message.delta.text
 
 
 postmark = PostmarkClient(server_token=os.getenv("POSTMARK_API_KEY"))
@@ -3,12 +3,12 @@ from firebase_admin import firestore
 from mongodb import client
 import json
 from helper_functions import use_claude
-from sentence_transformers import SentenceTransformer
+from helper.embeddings import encode
+from helper.json_stream import parse_segments
 from numpy import dot
 from numpy.linalg import norm
 from listOfFiles import files
 
-model = SentenceTransformer('all-mpnet-base-v2')
 
 
 
@@ -59,20 +59,12 @@ Ensure that your JSON is valid and that each segment contains every relevant pie
 
     response = use_claude(prompt);
 
-    # Extract the JSON content from the response
-    json_start = response.find('{')
-    json_end = response.rfind('}') + 1
-    json_content = response[json_start:json_end]
-
-    # Parse the JSON content
-    output = json.loads(json_content)
-   
-
-    knowledge = output['segments'];
+    # Recover every complete segment, even from a response that was cut off
+    knowledge = parse_segments(response, items_of="segments", start_after="</thinking>");
 
     for segment in knowledge:
 
-        segment_embedding = model.encode(segment);
+        segment_embedding = encode(segment);
 
         segment_embedding = segment_embedding.tolist();
 
@@ -1,5 +1,7 @@
 from helper_functions import print_conversation, use_claude, use_gemini, use_gpt, get_ordinal_suffix
-from sentence_transformers import SentenceTransformer
+from helper import embeddings
+from helper.embeddings import encode
+from helper.json_stream import parse_segments
 import json
 import os
 import time
@@ -10,8 +12,7 @@ from datetime import datetime
 from db import supabase
 import ast
 
-os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Force CPU usage
-model = SentenceTransformer('all-mpnet-base-v2', device='cpu')
+embeddings.configure(device='cpu')  # Force CPU usage
 
 
 class Memory:
@@ -40,7 +41,7 @@ class Memory:
     def find_or_add_node(self, knowledge):
         "This function takes in a piece of knowledge and either finds the node that already represents it or creates a new node"
 
-        segment_embedding = model.encode(knowledge)
+        segment_embedding = encode(knowledge)
         segment_embedding = segment_embedding.tolist()
 
         
@@ -133,9 +134,7 @@ class Memory:
 
         response = use_gemini(prompt)
         print("Memory Decider Output: ", response)
-        response = json.loads(response[response.find('{'):response.rfind('}')+1])
-
-        for memory in response['memories']:
+        for memory in parse_segments(response, items_of="memories"):
             self.find_or_add_node(memory)
         
         for i in range(len(self.activations)):
@@ -161,7 +160,7 @@ class Memory:
             return
 
         # Convert input to embedding once
-        input_embedding = np.array(model.encode(input))
+        input_embedding = np.array(encode(input))
         # Ensure node embeddings are properly formatted
         node_embeddings = []
         for node in self.nodes:
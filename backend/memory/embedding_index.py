@@ -0,0 +1,99 @@
+"""
+A small in-memory index of phrase embeddings.
+
+The working memory keys its knowledge by phrases and compares new phrases against the existing ones by cosine similarity.
+Rather than re-encoding every existing phrase for each comparison, the index keeps one normalized embedding per key in a
+contiguous matrix, so comparing a phrase against all keys is a single matrix-vector product.
+"""
+
+import numpy as np
+
+
+def normalize(vectors):
+    """Return L2-normalized float32 copies of one vector or a matrix of row vectors"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingIndex:
+    def __init__(self, initial_capacity=64):
+        """Initialize an empty index; the matrix is allocated on the first insert once the dimension is known"""
+        self.keys = []
+        self.positions = {}  # key -> row in the matrix
+        self._matrix = None
+        self._initial_capacity = initial_capacity
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    @property
+    def matrix(self):
+        """View of the filled rows of the embedding matrix"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:len(self.keys)]
+
+    def _reserve(self, extra, dim):
+        """Make room for `extra` more rows, doubling the capacity so that appends are amortized O(1)"""
+        needed = len(self.keys) + extra
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, needed)
+            self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        elif needed > self._matrix.shape[0]:
+            capacity = max(self._matrix.shape[0] * 2, needed)
+            grown = np.empty((capacity, dim), dtype=np.float32)
+            grown[:len(self.keys)] = self._matrix[:len(self.keys)]
+            self._matrix = grown
+
+    def add(self, key, embedding):
+        """Add a key with its embedding, or replace the embedding of an existing key"""
+        self.add_batch([key], np.asarray(embedding)[None, :])
+
+    def add_batch(self, keys, embeddings):
+        """Add several keys with a matrix of embeddings (one row per key)"""
+        embeddings = normalize(embeddings)
+        if embeddings.ndim != 2 or len(keys) != embeddings.shape[0]:
+            raise ValueError("Expected one embedding row per key")
+
+        new_rows = []
+        for key, embedding in zip(keys, embeddings):
+            if key in self.positions:
+                self._matrix[self.positions[key]] = embedding
+            else:
+                new_rows.append((key, embedding))
+
+        if not new_rows:
+            return
+
+        self._reserve(len(new_rows), embeddings.shape[1])
+        start = len(self.keys)
+        for offset, (key, embedding) in enumerate(new_rows):
+            self._matrix[start + offset] = embedding
+            self.positions[key] = start + offset
+            self.keys.append(key)
+
+    def similarities(self, embeddings):
+        """Cosine similarities between the given embedding(s) and every key, shape (len(self),) or (n, len(self))"""
+        if not self.keys:
+            embeddings = np.asarray(embeddings)
+            return np.empty(embeddings.shape[:-1] + (0,), dtype=np.float32)
+        return normalize(embeddings) @ self.matrix.T
+
+    def best_match(self, embedding, threshold):
+        """Return (key, similarity) of the most similar key at or above the threshold, or (None, best similarity)"""
+        scores = self.similarities(embedding)
+        if scores.size == 0:
+            return None, 0.0
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return (self.keys[best], score) if score >= threshold else (None, score)
+
+    def clear(self):
+        """Remove every key while keeping the allocated matrix around"""
+        self.keys = []
+        self.positions = {}
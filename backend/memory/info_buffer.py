@@ -0,0 +1,77 @@
+"""
+The info dump of working memory: raw information (e.g. search output) waiting to be turned into knowledge.
+
+Entries are keyed (by search id for search output), so adding and removing one is O(1) regardless of how much else is
+in the buffer. The total size is capped and the oldest entries are evicted first. All operations take a lock, since the
+decision loop reads the buffer while background threads add and remove entries.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+from consts import INFO_BUFFER_CAPACITY_CHARS
+
+
+class InfoBuffer:
+    def __init__(self, capacity=INFO_BUFFER_CAPACITY_CHARS):
+        self.capacity = capacity
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, info, key=None):
+        """Add an entry and return its key, evicting the oldest entries if the buffer is over capacity"""
+        with self._lock:
+            key = key if key is not None else f"info-{next(self._ids)}"
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = info
+            self._size += len(info)
+            while self._size > self.capacity and len(self._entries) > 1:
+                oldest, text = self._entries.popitem(last=False)
+                self._size -= len(text)
+                self.evicted += 1
+                print(f"Info dump over capacity, evicted {oldest}")
+            return key
+
+    def remove(self, key):
+        """Remove an entry; removing a key that was already evicted or removed is a no-op"""
+        with self._lock:
+            info = self._entries.pop(key, None)
+            if info is not None:
+                self._size -= len(info)
+            return info
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def text(self, max_chars=None):
+        """The buffer's contents, oldest first. With max_chars, only the newest entries that fit (the oldest one cut)"""
+        with self._lock:
+            if max_chars is None or self._size <= max_chars:
+                return "".join(self._entries.values())
+            parts = []
+            remaining = max_chars
+            for info in reversed(self._entries.values()):
+                if remaining <= 0:
+                    break
+                parts.append(info[-remaining:])
+                remaining -= len(info)
+            return "".join(reversed(parts))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __bool__(self):
+        return self._size > 0
@@ -1,68 +1,52 @@
-"this file is effectively the wrapper for using mongodb as the long term memory directly"
+"this file is effectively the wrapper for using the local vector store as the long term memory directly"
 
-import datetime
-from sentence_transformers import SentenceTransformer
-from numpy import dot
-from numpy.linalg import norm
-# from mongodb import client
+import os
+from helper.embeddings import encode
+from memory.vector_store import open_store
+from consts import LONG_TERM_MEMORY_DIR
 
-model = SentenceTransformer('all-mpnet-base-v2')
-class LongTermMemory:
-    def __init__(self):
-        """Initialize long-term memory as dictionaries of sentences"""
-        self.episodic = [];
-        self.semantic = [];
-        self.procedural = [];
-    
-    def store_memory(self):
-        """Store a memory in the appropriate category"""
+CATEGORIES = ("episodic", "semantic", "procedural")
 
-        # db = client.long_term_memory
-        # coll = db.semantic_memory
+class LongTermMemory:
+    def __init__(self, path=LONG_TERM_MEMORY_DIR, user_id=None):
+        """Open the episodic, semantic and procedural collections of long-term memory on disk"""
+        if user_id is not None:
+            path = os.path.join(path, str(user_id))
+        self.path = path
+        self.episodic = open_store(os.path.join(path, "episodic"))
+        self.semantic = open_store(os.path.join(path, "semantic"))
+        self.procedural = open_store(os.path.join(path, "procedural"))
 
-        
-        segment = "Hey my name is Soumil"
+    def _collection(self, category):
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown memory category: {category}. Expected one of {CATEGORIES}")
+        return getattr(self, category)
 
-        segment_embedding = model.encode(segment);
+    def store_memory(self, text, category="semantic", metadata=None):
+        """Store a memory in the appropriate category and return its id"""
 
-        segment_embedding = segment_embedding.tolist();
+        segment_embedding = encode(text)
 
-        # result = coll.insert_one({
-        #     'text': segment,
-        #     'embedding': segment_embedding
-        # })
+        return self._collection(category).add(text, segment_embedding, metadata)
 
-        # print(result);
+    def forget_memory(self, memory_id, category="semantic"):
+        """Delete a memory from the given category"""
+        self._collection(category).delete(memory_id)
 
 
-    def retrieve_memory(self, query):
-        """Retrieve a memory from long term memory based on the similarity score to the memory request"""
+    def retrieve_memory(self, query, category="semantic", limit=6, min_score=0.8, num_candidates=None):
+        """Retrieve a memory from long term memory based on the similarity score to the memory request.
 
-        # db = client.long_term_memory
-        # coll = db.semantic_memory
+        num_candidates bounds how many memories the approximate index scores (more candidates, higher recall).
+        """
 
-        segment_embedding = model.encode(query);
+        segment_embedding = encode(query)
 
-        segment_embedding = segment_embedding.tolist();
+        collection = self._collection(category)
+        results = collection.search(segment_embedding, limit=limit, min_score=min_score, num_candidates=num_candidates)
 
         resultsList = [];
+        for memory_id, score in results:
+            resultsList.append(collection.get(memory_id)['text']);
 
-        # results = coll.aggregate([
-        #     {
-        #         "$vectorSearch": {
-        #             "index": "embedding",
-        #             "path": "embedding",
-        #             "queryVector": segment_embedding,
-        #             "limit": 6,
-        #             "numCandidates": 41,
-        #             "minScore": 0.8
-        #         }
-        #     }
-        # ])
-
-        # for result in results:
-        #     resultsList.append(result['text']);
-
-        # return resultsList;
-
-
+        return resultsList;
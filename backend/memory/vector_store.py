@@ -0,0 +1,246 @@
+"""
+A local, append-only vector store used as the long-term memory backend.
+
+Each collection lives in its own directory:
+- embeddings.f32 holds the normalized float32 embeddings back to back and is memory-mapped for retrieval
+- records.jsonl is an append-only log of the text and metadata of every memory, one JSON object per line
+- offsets.u64 holds the byte offset of each record in the log, so a record is read with a single seek
+- tombstones.u64 is an append-only list of deleted ids
+- info.json holds the embedding dimension
+
+The number of memories is the number of entries in offsets.u64, which is always written last, so reopening a collection
+only maps the files and never has to scan the log.
+"""
+
+import os
+import json
+import threading
+import datetime
+import numpy as np
+from memory.embedding_index import normalize
+
+SEARCH_CHUNK_ROWS = 65536  # rows scored per matrix product, bounds the temporary memory used by a search
+
+
+class VectorStore:
+    def __init__(self, path):
+        """Open (or create) the collection stored in the given directory"""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._embeddings_path = os.path.join(path, "embeddings.f32")
+        self._records_path = os.path.join(path, "records.jsonl")
+        self._offsets_path = os.path.join(path, "offsets.u64")
+        self._tombstones_path = os.path.join(path, "tombstones.u64")
+        self._info_path = os.path.join(path, "info.json")
+        self._lock = threading.RLock()
+
+        self.dim = None
+        if os.path.exists(self._info_path):
+            with open(self._info_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        for file_path in (self._embeddings_path, self._records_path, self._offsets_path, self._tombstones_path):
+            open(file_path, "ab").close()
+
+        self._count = os.path.getsize(self._offsets_path) // 8
+        self._repair()
+
+        self._embeddings_file = open(self._embeddings_path, "ab")
+        self._records_file = open(self._records_path, "ab")
+        self._offsets_file = open(self._offsets_path, "ab")
+        self._tombstones_file = open(self._tombstones_path, "ab")
+        self._reader = open(self._records_path, "rb")
+        self._embeddings = None  # memory map of the first _mapped_count embeddings
+        self._offsets = None
+        self._mapped_count = 0
+
+        self._deleted = np.zeros(max(self._count, 1024), dtype=bool)
+        tombstones = np.fromfile(self._tombstones_path, dtype=np.uint64, count=os.path.getsize(self._tombstones_path) // 8)
+        tombstones = tombstones[tombstones < self._count].astype(np.int64)
+        self._deleted[tombstones] = True
+        self.deleted_count = int(self._deleted.sum())
+
+        self.index = None  # optional approximate index, see memory/ann_index.py
+
+    def _repair(self):
+        """Drop anything written after the last complete memory, e.g. if the process died in the middle of an append"""
+        with open(self._offsets_path, "r+b") as f:
+            f.truncate(self._count * 8)
+
+        with open(self._tombstones_path, "r+b") as f:
+            f.truncate(os.path.getsize(self._tombstones_path) // 8 * 8)
+
+        if self.dim is not None:
+            with open(self._embeddings_path, "r+b") as f:
+                f.truncate(self._count * self.dim * 4)
+
+        end = 0
+        if self._count > 0:
+            last_offset = int(np.fromfile(self._offsets_path, dtype=np.uint64, count=1, offset=(self._count - 1) * 8)[0])
+            with open(self._records_path, "rb") as f:
+                f.seek(last_offset)
+                end = last_offset + len(f.readline())
+        with open(self._records_path, "r+b") as f:
+            f.truncate(end)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def live_count(self):
+        """Number of memories that have not been deleted"""
+        return self._count - self.deleted_count
+
+    def _refresh_maps(self):
+        """Re-map the embedding and offset files if memories were appended since the last map"""
+        if self._mapped_count == self._count:
+            return
+        if self._count == 0:
+            self._embeddings, self._offsets = None, None
+        else:
+            self._embeddings = np.memmap(self._embeddings_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+            self._offsets = np.memmap(self._offsets_path, dtype=np.uint64, mode="r", shape=(self._count,))
+        self._mapped_count = self._count
+
+    def add(self, text, embedding, metadata=None):
+        """Append one memory and return its id"""
+        return self.add_batch([text], np.asarray(embedding)[None, :], [metadata])[0]
+
+    def add_batch(self, texts, embeddings, metadatas=None):
+        """Append several memories (one embedding row per text) and return their ids"""
+        embeddings = normalize(embeddings)
+        if embeddings.ndim != 2 or len(texts) != embeddings.shape[0]:
+            raise ValueError("Expected one embedding row per text")
+        metadatas = metadatas or [None] * len(texts)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                with open(self._info_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {embeddings.shape[1]}")
+
+            ids = list(range(self._count, self._count + len(texts)))
+            created_at = datetime.datetime.now().isoformat()
+
+            offsets = []
+            offset = self._records_file.tell()
+            lines = []
+            for memory_id, text, metadata in zip(ids, texts, metadatas):
+                line = (json.dumps({"id": memory_id, "text": text, "metadata": metadata or {}, "created_at": created_at}) + "\n").encode()
+                offsets.append(offset)
+                offset += len(line)
+                lines.append(line)
+
+            # The offsets are written last: a memory only exists once its offset is on disk
+            self._records_file.write(b"".join(lines))
+            self._records_file.flush()
+            self._embeddings_file.write(embeddings.tobytes())
+            self._embeddings_file.flush()
+            self._offsets_file.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+            self._offsets_file.flush()
+
+            self._count += len(texts)
+            if self._count > len(self._deleted):
+                grown = np.zeros(max(len(self._deleted) * 2, self._count), dtype=bool)
+                grown[:len(self._deleted)] = self._deleted
+                self._deleted = grown
+            return ids
+
+    def delete(self, memory_id):
+        """Delete a memory by writing a tombstone; its row stays on disk but is never returned by a search again"""
+        with self._lock:
+            if not 0 <= memory_id < self._count:
+                raise IndexError(f"No memory with id {memory_id}")
+            if self._deleted[memory_id]:
+                return
+            self._tombstones_file.write(np.asarray([memory_id], dtype=np.uint64).tobytes())
+            self._tombstones_file.flush()
+            self._deleted[memory_id] = True
+            self.deleted_count += 1
+
+    def is_deleted(self, memory_id):
+        """Whether a memory has been deleted"""
+        return bool(self._deleted[memory_id])
+
+    def deleted_mask(self, memory_ids):
+        """Boolean array telling which of the given ids have been deleted"""
+        return self._deleted[memory_ids]
+
+    def get(self, memory_id):
+        """Read the record (id, text, metadata, created_at) of a memory"""
+        with self._lock:
+            if not 0 <= memory_id < self._count:
+                raise IndexError(f"No memory with id {memory_id}")
+            self._refresh_maps()
+            self._reader.seek(int(self._offsets[memory_id]))
+            return json.loads(self._reader.readline())
+
+    def embeddings(self):
+        """Memory-mapped (read-only) matrix of every stored embedding"""
+        with self._lock:
+            self._refresh_maps()
+            if self._embeddings is None:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return self._embeddings
+
+    def search(self, query_embedding, limit=6, min_score=0.0, exact=False, **index_options):
+        """Return up to `limit` (id, score) pairs with a cosine score of at least min_score, best first.
+
+        Goes through the approximate index when one is attached and trained, unless exact is True.
+        """
+        if not exact and self.index is not None:
+            results = self.index.search(query_embedding, limit=limit, min_score=min_score, **index_options)
+            if results is not None:
+                return results
+        return self.exact_search(query_embedding, limit=limit, min_score=min_score)
+
+    def exact_search(self, query_embedding, limit=6, min_score=0.0):
+        """Brute-force top-k search over every live memory"""
+        matrix = self.embeddings()
+        if len(matrix) == 0 or limit <= 0:
+            return []
+        query = normalize(query_embedding)
+
+        candidate_ids = []
+        candidate_scores = []
+        for start in range(0, len(matrix), SEARCH_CHUNK_ROWS):
+            scores = matrix[start:start + SEARCH_CHUNK_ROWS] @ query
+            keep = np.flatnonzero((scores >= min_score) & ~self._deleted[start:start + len(scores)])
+            if len(keep) > limit:
+                keep = keep[np.argpartition(scores[keep], -limit)[-limit:]]
+            candidate_ids.append(keep + start)
+            candidate_scores.append(scores[keep])
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores)[:limit]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def close(self):
+        """Close the underlying files"""
+        with self._lock:
+            if self.index is not None:
+                self.index.close()
+            for f in (self._embeddings_file, self._records_file, self._offsets_file, self._tombstones_file, self._reader):
+                f.close()
+            self._embeddings, self._offsets = None, None
+            self._mapped_count = 0
+
+
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+
+def open_store(path, with_index=True):
+    """Return the VectorStore for a directory, sharing one instance per path so appends from different agents don't interleave"""
+    path = os.path.abspath(path)
+    with _open_stores_lock:
+        if path not in _open_stores:
+            store = VectorStore(path)
+            if with_index:
+                from memory.ann_index import IVFIndex
+                IVFIndex(store)
+            _open_stores[path] = store
+        return _open_stores[path]
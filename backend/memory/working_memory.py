@@ -7,15 +7,97 @@ and the strings of sentences are just the bits of knowledge about that idea them
 
 import threading
 import time
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from numpy import dot
 from numpy.linalg import norm
 # from mongodb import client
-from consts import IDENTITY_THRESHOLD, SIMILARITY_THRESHOLD
-from helper_functions import use_claude
+from consts import IDENTITY_THRESHOLD, SIMILARITY_THRESHOLD, WORKING_MEMORY_TOKEN_BUDGET, HISTORY_WINDOW, HISTORY_SUMMARY_BATCH, RECENT_ENTRIES_WINDOW, INFO_DUMP_MAX_CHARS, SEGMENTATION_CHUNK_CHARS, SEGMENTATION_CONCURRENCY, SEGMENTATION_MAX_TOKENS, SEGMENTATION_DEADLINE, KNOWLEDGE_BATCH_SIZE, KNOWLEDGE_BATCH_SECONDS
+from helper_functions import use_claude, use_claude_stream
+from helper.json_stream import SegmentStream
+from memory.embedding_index import EmbeddingIndex, normalize
+from memory.info_buffer import InfoBuffer
+from helper.embeddings import encode, encode_batch
 import json;
-model = SentenceTransformer('all-mpnet-base-v2')
+
+CHARS_PER_TOKEN = 4 # rough estimate, good enough for budgeting the prompt
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a string"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def truncate_to_tokens(text, tokens, keep="start"):
+    """Cut a string down to roughly the given number of tokens, keeping its start or its end"""
+    max_chars = max(0, tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    if keep == "end":
+        return "[...truncated]\n" + text[len(text) - max_chars:]
+    return text[:max_chars] + "\n[...truncated]"
+
+def split_into_chunks(text, max_chars=SEGMENTATION_CHUNK_CHARS):
+    """Split text into chunks of at most max_chars, breaking between pages of search output first and paragraphs second"""
+    pages = [page for page in re.split(r"\n(?=\s*URL: )", text) if page.strip()]
+    chunks = []
+    current = ""
+    for page in pages:
+        pieces = [page] if len(page) <= max_chars else page.split("\n")
+        for piece in pieces:
+            # A single paragraph longer than a chunk is cut at the limit
+            while len(piece) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            if len(current) + len(piece) + 1 > max_chars and current:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+class SegmentBatcher:
+    """Collects segments as they stream in from several threads and hands them to store_batch in groups, so they are
+    encoded in batches but still published within max_wait seconds of being parsed"""
+
+    def __init__(self, store_batch, batch_size=KNOWLEDGE_BATCH_SIZE, max_wait=KNOWLEDGE_BATCH_SECONDS):
+        self.store_batch = store_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None # flushes the pending segments max_wait after the first of them arrived
+        self._lock = threading.Lock()
+
+    def add(self, segment):
+        with self._lock:
+            self._pending.append(segment)
+            if len(self._pending) < self.batch_size:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.max_wait, self._flush_on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Store every pending segment now"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if batch:
+            self.store_batch(batch)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error storing knowledge segments: {e}")
 
 class WorkingMemory:
     def __init__(self):
@@ -26,23 +108,37 @@ class WorkingMemory:
         self.observations = []  # History of observations and final outputs
         self.current_actions = [] # Actions that are currently being executed
         self.actions = []  # History of actions taken
-        self.knowledge = {}
+        self.knowledge = {} # Replaced, never mutated, on every update, so a reference to it is a consistent snapshot
+        self.knowledge_index = EmbeddingIndex() # cached, normalized embeddings of the knowledge keys
+        self.knowledge_version = 0 # Number of knowledge segments published so far
+        self.ingestions_running = 0 # Background text_to_knowledge calls still in progress
+        self._knowledge_changed = threading.Condition()
         self.variables = {} # These are variables that apply to extremely user-specific values within the agent's context. 
         # for example, if the agent is trying to book a flight, the variables could be the departure and arrival airports, the dates of the flight, etc.
         # if the agent is trying to find a restaurant, the variables could be the type of food, the price range, the location, etc.
         # if the agent is trying to send an email, the variables would be the email address.
         self.conversation_history = []
-        self.info_dump = ""
+        self.history_summary = "" # Rolling summary of the conversation entries that no longer fit in the history window
+        self.summarized_count = 0 # Number of conversation entries covered by the summary
+        self._summary_lock = threading.Lock()
+        self._query_embedding = (None, None) # (query, embedding) of the last query knowledge was ranked against
+        self.info_dump = InfoBuffer() # Raw info (e.g. search output) keyed by search id, until it has been turned into knowledge
         
         # Start a background thread to update datetime every minute
+        self._stopped = threading.Event()
         self.update_thread = threading.Thread(target=self._update_datetime, daemon=True)
         self.update_thread.start()
         
     def _update_datetime(self):
         """Update datetime every minute in a background thread"""
-        while True:
+        while not self._stopped.is_set():
             self.basic_information["datetime"] = datetime.datetime.now().isoformat()
-            time.sleep(60)  # Sleep for 60 seconds
+            self._stopped.wait(60)  # Sleep for 60 seconds
+
+    def close(self):
+        """Stop the background datetime thread"""
+        self._stopped.set()
+
     def store_observation(self, observation):
         """Store an observation or final output"""
         self.observations.append(observation)
@@ -66,6 +162,57 @@ class WorkingMemory:
             "message": message
         })
 
+        # Fold the entries that fell out of the history window into the rolling summary, in batches and off the decision thread
+        if len(self.conversation_history) - self.summarized_count >= HISTORY_WINDOW + HISTORY_SUMMARY_BATCH:
+            threading.Thread(target=self.summarize_history, daemon=True).start()
+
+    def summarize_history(self):
+        """Update the rolling summary with every conversation entry older than the history window"""
+        if not self._summary_lock.acquire(blocking=False):
+            return # Another summarization is already running
+        try:
+            end = len(self.conversation_history) - HISTORY_WINDOW
+            if end <= self.summarized_count:
+                return
+            entries = "\n".join([f"{msg['role'].capitalize()}: {msg['message']}" for msg in self.conversation_history[self.summarized_count:end]])
+
+            prompt = f"""
+            You are maintaining a running summary of a conversation between a user and an assistant.
+
+            Here is the summary so far:
+            <summary>
+            {self.history_summary if self.history_summary else "No summary yet."}
+            </summary>
+
+            Here are the next messages of the conversation:
+            <messages>
+            {entries}
+            </messages>
+
+            Update the summary so that it also covers these messages. Keep every request, decision, fact and personal detail the user gave, and drop pleasantries.
+            Be concise. Output only the updated summary inside <summary> tags.
+            """
+
+            response = use_claude(prompt)
+            summary_start = response.find("<summary>")
+            summary_end = response.find("</summary>")
+            if summary_start != -1 and summary_end != -1:
+                response = response[summary_start + len("<summary>"):summary_end]
+
+            self.history_summary = response.strip()
+            self.summarized_count = end
+        except Exception as e:
+            print(f"Error summarizing conversation history: {e}")
+        finally:
+            self._summary_lock.release()
+
+    def current_query(self):
+        """The latest user message, which is what the knowledge is ranked against by default"""
+        for msg in reversed(self.conversation_history):
+            if msg["role"] == "user":
+                return msg["message"]
+        return None
+
     def retrieve_all(self):
         """Retrieve all contents of working memory"""
         return {
@@ -78,42 +225,139 @@ class WorkingMemory:
         """Clear working memory"""
         self.observations = []
         self.actions = []
-        self.knowledge = {}
-
+        # knowledge_version is left alone: it counts published segments, and clearing publishes none
+        with self._knowledge_changed:
+            self.knowledge = {}
+            self.knowledge_index.clear()
 
-    def store_knowledge(self, knowledge_segment):
-        """Store knowledge"""
+    def knowledge_snapshot(self):
+        """The current knowledge and its version. The dict is never modified afterwards, so it is safe to read while ingestion goes on"""
+        with self._knowledge_changed:
+            return self.knowledge_version, self.knowledge
 
-        # Extract phrase and sentences from knowledge segment
-        print("KNOWLEDGE SEGMENT: ",knowledge_segment)
-        phrase = knowledge_segment["title"]
-        sentences = knowledge_segment['content']
-        
-        # Get embedding for the phrase
-        phrase_embedding = model.encode(phrase)
-        
-        # Check if any existing knowledge matches above identity threshold
-        found_match = False
-        for existing_phrase in self.knowledge:
-            existing_embedding = model.encode(existing_phrase)
-            similarity = dot(phrase_embedding, existing_embedding)/(norm(phrase_embedding)*norm(existing_embedding))
-            
-            if similarity >= IDENTITY_THRESHOLD:
-                # Add sentences to existing matching phrase
-                self.knowledge[existing_phrase].extend(sentences)
-                found_match = True
-                break
-                
-        if not found_match:
-            # Create new entry if no match found
-            self.knowledge[phrase] = sentences
+    def wait_for_knowledge(self, since_version, min_segments=1, timeout=None):
+        """Wait until min_segments have been published since since_version, or until no ingestion is running.
 
+        Returns the number of segments published since since_version.
+        """
+        with self._knowledge_changed:
+            self._knowledge_changed.wait_for(
+                lambda: self.knowledge_version - since_version >= min_segments or self.ingestions_running == 0, timeout)
+            return self.knowledge_version - since_version
+
+    def ingest_in_background(self, text, query=None, info_key=None):
+        """Turn text into knowledge on a background thread, removing its info dump entry once done. Returns the thread"""
+        # Counted before the thread starts, so a wait_for_knowledge right after this call cannot miss it
+        with self._knowledge_changed:
+            self.ingestions_running += 1
+
+        def ingest():
+            try:
+                self.text_to_knowledge(text, query)
+                if info_key is not None:
+                    self.remove_info(info_key)
+            except Exception as e:
+                print(f"Error turning text into knowledge: {e}")
+            finally:
+                with self._knowledge_changed:
+                    self.ingestions_running -= 1
+                    self._knowledge_changed.notify_all()
+
+        thread = threading.Thread(target=ingest, daemon=True)
+        thread.start()
+        return thread
 
-    def text_to_knowledge(self, text, query=None):
 
+    def store_knowledge(self, knowledge_segment):
+        """Store knowledge"""
+        self.store_knowledge_batch([knowledge_segment])
+
+    def store_knowledge_batch(self, knowledge_segments):
+        """Store several knowledge segments at once, encoding all of their titles in a single batch"""
+        if not knowledge_segments:
+            return
+
+        for knowledge_segment in knowledge_segments:
+            print("KNOWLEDGE SEGMENT: ", knowledge_segment)
+
+        phrases = [segment["title"] for segment in knowledge_segments]
+
+        # One batched forward pass for every title, outside the lock
+        phrase_embeddings = normalize(encode_batch(phrases))
+        batch_similarities = phrase_embeddings @ phrase_embeddings.T
+
+        with self._knowledge_changed:
+            self._publish_knowledge(knowledge_segments, phrases, phrase_embeddings, batch_similarities)
+
+    def _publish_knowledge(self, knowledge_segments, phrases, phrase_embeddings, batch_similarities):
+        """Merge segments into the knowledge and publish the result as a new version. Called with the knowledge lock held"""
+        # Similarity of every title against the existing keys
+        existing_similarities = self.knowledge_index.similarities(phrase_embeddings)
+
+        merged = {}  # existing key or new phrase -> sentences to add
+        new_phrases = []  # indices of titles that become new keys
+        for i, phrase in enumerate(phrases):
+            target = None
+            if existing_similarities.shape[1] > 0:
+                best = int(np.argmax(existing_similarities[i]))
+                if existing_similarities[i, best] >= IDENTITY_THRESHOLD:
+                    target = self.knowledge_index.keys[best]
+
+            if target is None and new_phrases:
+                best = int(np.argmax(batch_similarities[i, new_phrases]))
+                if batch_similarities[i, new_phrases[best]] >= IDENTITY_THRESHOLD:
+                    target = phrases[new_phrases[best]]
+
+            if target is None:
+                target = phrase
+                new_phrases.append(i)
+
+            merged.setdefault(target, []).extend(knowledge_segments[i]["content"])
+
+        # Copy on write: readers holding the previous dict keep seeing a consistent version
+        knowledge = dict(self.knowledge)
+        for phrase, sentences in merged.items():
+            knowledge[phrase] = knowledge.get(phrase, []) + sentences
+        self.knowledge_index.add_batch([phrases[i] for i in new_phrases], phrase_embeddings[new_phrases])
+        self.knowledge = knowledge
+        self.knowledge_version += len(knowledge_segments)
+        self._knowledge_changed.notify_all()
+
+
+    def text_to_knowledge(self, text, query=None, on_progress=None):
+        """Parses a bunch of text into knowledge segments and then adds it to memory.
+
+        The text is split into chunks that are segmented in parallel. Segments are parsed from the streamed responses as
+        they arrive and merged into the knowledge in small batches (see SegmentBatcher), so they are published soon after
+        they are parsed while their titles are still encoded together. on_progress(done, total, segments) is called after
+        every chunk.
+        """
         start_time = time.time()
-        """Parses a bunch of text into knowledge segments and then adds it to memory"""
 
+        chunks = split_into_chunks(text)
+        batcher = SegmentBatcher(self.store_knowledge_batch)
+        done = 0
+        with ThreadPoolExecutor(max_workers=SEGMENTATION_CONCURRENCY) as executor:
+            futures = [executor.submit(self.segment_text, chunk, query, batcher.add) for chunk in chunks]
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    segments = future.result()
+                except Exception as e:
+                    # Segments parsed before the failure are still stored
+                    print(f"Error segmenting chunk: {e}")
+                    segments = []
+                batcher.flush()
+
+                print(f"Segmented {done}/{len(chunks)} chunks ({len(segments)} segments)")
+                if on_progress:
+                    on_progress(done, len(chunks), segments)
+
+        end_time = time.time()
+        print(f"Time to segment knowledge: {end_time - start_time}")
+
+    def segment_text(self, text, query=None, on_segment=None):
+        """Break one chunk of text into knowledge segments with the LLM, calling on_segment(segment) as each one is parsed"""
         prompt = f"""
         You are an expert in information analysis and organization. Your task is to analyze a given text on any topic and break it down into distinct, self-contained segments. Each segment should focus on a single idea or concept related to the main topic of the text.
 
@@ -173,29 +417,25 @@ class WorkingMemory:
         """
 
 
-        response = use_claude(prompt)
+        # Segments are parsed out of the response while it streams, and a response cut off at the token limit still
+        # yields every segment it completed
+        stream = SegmentStream(start_after="</analysis>")
+        segments = []
 
-        # Extract the JSON content from the response
-        json_start = response.find('{')
-        json_end = response.rfind('}') + 1
-        json_content = response[json_start:json_end]
-
-        # Parse the JSON content
-        output = json.loads(json_content)
-
-        # Iterate through each segment title and its sentences
-        for segment_title, sentences in output.items():
-            # Create a JSON object for this segment
-            segment_obj = {
-                "title": segment_title,
-                "content": sentences
-            }
-            
-            # Store the segment in memory
+        def add(new_segments):
+            new_segments = [{"title": segment_title, "content": sentences if isinstance(sentences, list) else [sentences]}
+                            for segment_title, sentences in new_segments]
+            segments.extend(new_segments)
+            if on_segment:
+                for segment in new_segments:
+                    on_segment(segment)
+
+        # Up to SEGMENTATION_MAX_TOKENS of output takes much longer than an ordinary call, so the stream gets its own deadline
+        for text_delta in use_claude_stream(prompt, max_tokens=SEGMENTATION_MAX_TOKENS, deadline=SEGMENTATION_DEADLINE):
+            add(stream.feed(text_delta))
+        add(stream.finish())
 
-            end_time = time.time()
-            print(f"Time to segment knowledge: {end_time - start_time}")
-            self.store_knowledge(segment_obj)
+        return segments
 
 
     def get_variable(self, variable_name):
@@ -204,11 +444,11 @@ class WorkingMemory:
             return self.variables[variable_name]
         else:
             # check to see if it meets the identify threshold
-            phrase_embedding = model.encode(variable_name)
+            phrase_embedding = encode(variable_name)
             best_match = None
             highest_similarity = IDENTITY_THRESHOLD
             for variable_key in self.variables:
-                existing_embedding = model.encode(variable_key)
+                existing_embedding = encode(variable_key)
                 similarity = dot(phrase_embedding, existing_embedding)/(norm(phrase_embedding)*norm(existing_embedding))
                 if similarity >= IDENTITY_THRESHOLD and similarity > highest_similarity:
                     highest_similarity = similarity
@@ -221,11 +461,11 @@ class WorkingMemory:
             self.variables[variable_name] = variable_value
         else:
             # check to see if it meets the identify threshold
-            phrase_embedding = model.encode(variable_name)
+            phrase_embedding = encode(variable_name)
             best_match = None
             highest_similarity = IDENTITY_THRESHOLD
             for variable_key in self.variables:
-                existing_embedding = model.encode(variable_key)
+                existing_embedding = encode(variable_key)
                 similarity = dot(phrase_embedding, existing_embedding)/(norm(phrase_embedding)*norm(existing_embedding))
                 if similarity >= IDENTITY_THRESHOLD and similarity > highest_similarity:
                     highest_similarity = similarity
@@ -238,22 +478,22 @@ class WorkingMemory:
     
     def get_related_variables(self, phrase):
         """Get related variables"""
-        phrase_embedding = model.encode(phrase)
+        phrase_embedding = encode(phrase)
         related_variables = []
         for variable in self.variables:
-            variable_embedding = model.encode(variable)
+            variable_embedding = encode(variable)
             similarity = dot(phrase_embedding, variable_embedding)/(norm(phrase_embedding)*norm(variable_embedding))
             if similarity >= SIMILARITY_THRESHOLD:
                 related_variables.append(variable)
         return related_variables
 
-    def dump_info(self, info):
-        """Dump info"""
-        self.info_dump += info
+    def dump_info(self, info, key=None):
+        """Dump info and return the key to remove it with"""
+        return self.info_dump.add(info, key)
 
-    def remove_info(self, string):
+    def remove_info(self, key):
         """Remove info"""
-        self.info_dump = self.info_dump.replace(string, "")
+        self.info_dump.remove(key)
 
     # def get_variables_from_input(self):
     #     """This function will be called after each input, to extract important variables that the user may have provided. The variables are entirely dependent on the user, so it can be assumed that they can fully be extracted from the input"""
@@ -365,7 +605,7 @@ class WorkingMemory:
         Here is the working memory:
 
         <working_memory>
-        {self.print()}
+        {self.print(query=query)}
         </working_memory>
 
         Instructions:
@@ -414,27 +654,71 @@ class WorkingMemory:
             print(f"Error parsing reasoning response: {e}")
             return None
 
-    def print(self): 
-        """Return a formatted string of the contents of working memory"""
-        return f"""
-        ## Basic Information
-        {"\n".join([f"### {key}\n{value}" for key, value in self.basic_information.items()]) if self.basic_information else "No basic information recorded yet."}
-        
-        ## Observations
-        {self.observations if self.observations else "No observations recorded yet."}
-        
-        ## Conversation History
-        {"\n".join([f"{msg['role'].capitalize()}: {msg['message']}" for msg in self.conversation_history]) if self.conversation_history else "No conversation history yet."}
-
-        ## Info Dump
-        {self.info_dump if self.info_dump else "No additional info dump"}
+    def rank_knowledge(self, query=None, knowledge=None):
+        """Knowledge keys ordered by similarity to the query, or newest first when there is no query"""
+        knowledge = knowledge if knowledge is not None else self.knowledge
+        if not query or not knowledge:
+            return list(reversed(list(knowledge)))
+
+        if self._query_embedding[0] != query:
+            self._query_embedding = (query, encode(query))
+        with self._knowledge_changed:
+            keys = list(self.knowledge_index.keys)
+            scores = self.knowledge_index.similarities(self._query_embedding[1])
+        ranked = [keys[i] for i in np.argsort(-scores)]
+        return [key for key in ranked if key in knowledge]
+
+    def render(self, query=None, token_budget=WORKING_MEMORY_TOKEN_BUDGET, info_dump_max_chars=INFO_DUMP_MAX_CHARS):
+        """Return a formatted string of working memory that fits in roughly token_budget tokens.
+
+        Only the newest conversation entries are shown verbatim, with a rolling summary of the older ones; observations
+        and actions are limited to the newest ones; the info dump is capped; and the knowledge segments most similar to
+        the query (the latest user message by default) fill whatever budget is left.
+        """
+        query = query or self.current_query()
+
+        history_start = max(self.summarized_count, len(self.conversation_history) - HISTORY_WINDOW - HISTORY_SUMMARY_BATCH)
+        recent_history = self.conversation_history[history_start:]
+        history = ""
+        if history_start > 0:
+            history += f"### Summary of the earlier conversation\n{self.history_summary if self.history_summary else f'({history_start} earlier messages not shown)'}\n### Latest messages\n"
+        history += "\n".join([f"{msg['role'].capitalize()}: {msg['message']}" for msg in recent_history]) if recent_history else "No conversation history yet."
+
+        observations = self.observations[-RECENT_ENTRIES_WINDOW:]
+        actions = self.actions[-RECENT_ENTRIES_WINDOW:]
+
+        sections = {
+            "Basic Information": "\n".join([f"### {key}\n{value}" for key, value in self.basic_information.items()]) if self.basic_information else "No basic information recorded yet.",
+            "Observations": (f"({len(self.observations) - len(observations)} earlier observations not shown)\n" if len(self.observations) > len(observations) else "") + (str(observations) if observations else "No observations recorded yet."),
+            "Conversation History": history,
+            "Info Dump": "",
+            "Actions Taken": (f"({len(self.actions) - len(actions)} earlier actions not shown)\n" if len(self.actions) > len(actions) else "") + (str(actions) if actions else "No actions taken yet."),
+            "Knowledge": "",
+            "User-Specific Variables": str(self.variables) if self.variables else "No variables set yet.",
+        }
 
-        ## Actions Taken
-        {self.actions if self.actions else "No actions taken yet."}
-        
-        ## Knowledge
-        {[strings for strings in self.knowledge.values()] if self.knowledge else "No knowledge recorded or reasoned."}
-        
-        ## User-Specific Variables
-        {self.variables if self.variables else "No variables set yet."}
-        """
\ No newline at end of file
+        remaining = token_budget - sum(estimate_tokens(text) for text in sections.values()) - 10 * len(sections)
+
+        # The info dump gets at most half of what is left, and never more than info_dump_max_chars
+        info_dump = truncate_to_tokens(self.info_dump.text(info_dump_max_chars), max(0, remaining // 2), keep="end")
+        sections["Info Dump"] = info_dump if info_dump else "No additional info dump"
+        remaining -= estimate_tokens(sections["Info Dump"])
+
+        _, snapshot = self.knowledge_snapshot()
+        knowledge = []
+        for key in self.rank_knowledge(query, snapshot):
+            segment = f"### {key}\n" + "\n".join(str(sentence) for sentence in snapshot[key])
+            cost = estimate_tokens(segment)
+            if cost > remaining:
+                continue
+            knowledge.append(segment)
+            remaining -= cost
+        if knowledge and len(knowledge) < len(snapshot):
+            knowledge.append(f"({len(snapshot) - len(knowledge)} less relevant knowledge segments not shown)")
+        sections["Knowledge"] = "\n".join(knowledge) if snapshot else "No knowledge recorded or reasoned."
+
+        return "\n" + "\n\n".join(f"## {title}\n{text}" for title, text in sections.items()) + "\n"
+
+    def print(self, query=None, token_budget=WORKING_MEMORY_TOKEN_BUDGET):
+        """Return a formatted string of the contents of working memory"""
+        return self.render(query=query, token_budget=token_budget)
@@ -1,90 +1,150 @@
-from scrapling import Fetcher
-import threading
-import os
-import requests
-import dotenv
-from scrapingbee import ScrapingBeeClient
 import time
+from searching.fetcher import SEARCH_DEADLINE
+from searching.cache import get_search_cache, normalize_query
+from searching.extraction import extract_text
+from searching.passages import select_passages
+from searching.dedupe import NearDuplicateFilter, ParagraphFilter
+from searching.providers import get_provider
+from helper.embeddings import encode
 
 
-dotenv.load_dotenv()
+def search(query, searching_logo_callback, on_page=None, deadline=SEARCH_DEADLINE, prefilter=True, provider=None, cache=True, stats=None):
+    """Search the web for the query and return the text of the top results that loaded before the deadline.
 
-fetcher = Fetcher(auto_match=False)
-
-def search(query, searching_logo_callback):
+    on_page(url, text) is called as each page finishes, so callers can start using the fastest pages right away.
+    With prefilter, only the passages of each page most relevant to the query are kept. provider is a SearchProvider or
+    the name of one (SEARCH_PROVIDER by default), cache is a SearchCache, True for the shared one or None to bypass
+    caching, and a stats dict, if given, is filled with per-stage timings in seconds and the number of bytes fetched.
+    """
+    provider = provider if provider is not None and not isinstance(provider, str) else get_provider(provider)
+    cache = get_search_cache() if cache is True else cache
+    stats = stats if stats is not None else {}
+    stats.update({"results": 0.0, "fetch": 0.0, "extract": 0.0, "prefilter": 0.0, "dedupe": 0.0, "bytes": 0, "pages": 0, "cached_pages": 0})
 
     start_time = time.time()
+    search_output = f"Query: {query}\n\n"
 
-    search_url = f"https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": os.getenv("GOOGLE_SEARCH_API_KEY"), 
-        "cx": os.getenv("GOOGLE_CUSTOM_SEARCH_ENGINE_ID"),
-        "q": query,
-    }
+    # Result lists are cached per provider and normalized query, so repeated searches skip the search API entirely
+    query_key = f"{provider.name}:{normalize_query(query)}"
+    cached_results = cache.get("results", query_key) if cache else None
+    if cached_results:
+        items = cached_results["value"]
+    else:
+        try:
+            items = provider.search(query)
+        except Exception as e:
+            print(f"Failed to retrieve search results: {str(e)}")
+            items = []
+        if not items:
+            return search_output
+        if cache:
+            cache.put("results", query_key, items)
+    stats["results"] = time.time() - start_time
 
-    response = requests.get(search_url, params=params)
-    search_output = f"Query: {query}\n\n"
-    if response.status_code == 200:
-        search_results = response.json()
-
-        # print("SEARCH RESULTS: ", search_results)
-
-        # Extract URLs and logos from search results
-        urls = []
-        for item in search_results.get('items', [])[:5]:
-            url = item.get('link')
-            urls.append(url)
-
-            domainURL = (url.split('/')[2])
-            logo = f"https://www.google.com/s2/favicons?sz=64&domain_url={domainURL}"
-            if searching_logo_callback:
-                searching_logo_callback(logo)
-            
-        print("URLS: ", urls)
-        
-        # Start of Selection
-        # Create list to store threads
-        threads = []
-        # Dictionary to store results from each thread
-        results = {}
+    # Extract URLs and logos from search results
+    urls = []
+    for item in items:
+        url = item.get('link')
+        urls.append(url)
+
+        domainURL = (url.split('/')[2])
+        logo = f"https://www.google.com/s2/favicons?sz=64&domain_url={domainURL}"
+        if searching_logo_callback:
+            searching_logo_callback(logo)
         
-        def fetch_url(url):
+    print("URLS: ", urls)
+
+    results = {}
+    query_embedding = encode(query) if prefilter else None
+    # Mirrored pages and paragraphs repeated across pages are collapsed as the pages arrive
+    duplicate_pages = NearDuplicateFilter()
+    duplicate_paragraphs = ParagraphFilter()
+
+    def use_page(url, text):
+        stage_start = time.time()
+        if text:
+            original = duplicate_pages.check(url, text)
+            if original:
+                print(f"{url} is a near-duplicate of {original}")
+                results[url] = f"Near-duplicate of {original}"
+                stats["dedupe"] += time.time() - stage_start
+                return
+        stats["dedupe"] += time.time() - stage_start
+
+        # The cache keeps the full page text; the query-specific passage selection happens on the way out
+        stage_start = time.time()
+        if text and prefilter:
+            text = select_passages(query, text, query_embedding=query_embedding)
+        stats["prefilter"] += time.time() - stage_start
+
+        stage_start = time.time()
+        if text:
+            text = duplicate_paragraphs.filter(text)
+        stats["dedupe"] += time.time() - stage_start
+
+        results[url] = text
+        if on_page:
+            on_page(url, text)
+
+    # Pages still fresh in the cache are used as is; expired ones are revalidated with a conditional request
+    stale_pages = {}
+    to_fetch = []
+    for url in urls:
+        cached_page = cache.get("pages", url, allow_stale=True) if cache else None
+        if cached_page and cached_page["fresh"]:
+            stats["cached_pages"] += 1
+            use_page(url, cached_page["value"])
+            continue
+        if cached_page:
+            stale_pages[url] = cached_page
+        to_fetch.append(url)
+
+    # Pages are fetched concurrently; whatever has not arrived by the deadline is left out
+    remaining = max(0.0, deadline - (time.time() - start_time))
+    headers = {url: cache.conditional_headers(entry) for url, entry in stale_pages.items()} if cache else None
+    fetch_start = time.time()
+    processing = 0.0
+    for page in provider.fetch_pages(to_fetch, deadline=remaining, headers=headers):
+        processing_start = time.time()
+        url = page["url"]
+        stats["bytes"] += page.get("bytes", 0)
+        if page["error"]:
+            print(f"Error fetching {url}: {page['error']}")
+            results[url] = None
+            continue
+        stats["pages"] += 1
+        if page["status"] == 304 and url in stale_pages:
+            text = stale_pages[url]["value"]
+            cache.refresh("pages", url)
+        else:
             try:
-                page = fetcher.get(url)
-                # Extract main content from the page using a specific selector
-                main_content = page.css_first('main')  # Adjust the selector based on the website's structure
-                if main_content:
-                    text = main_content.get_all_text(ignore_tags=('script', 'style'))
-                else:
-                    # Fallback to extracting all text if main content is not found
-                    text = page.get_all_text(ignore_tags=('script', 'style'))
-                results[url] = text
+                text = extract_text(page["html"])
             except Exception as e:
-                print(f"Error fetching {url}: {str(e)}")
+                print(f"Error extracting {url}: {str(e)}")
                 results[url] = None
-        
-        # Start all threads
-        for url in urls:
-            thread = threading.Thread(target=fetch_url, args=(url,))
-            thread.start()
-            threads.append(thread)
-        
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
-        
-        # Add results to search output
-        for url in urls:
-            text = results.get(url, "Error fetching page")
-            search_output += f"""
-            URL: {url}
-            CONTENT:
-            {text}
-            """
-    else:
-        print(f"Failed to retrieve search results, status code: {response.status_code}")
+                continue
+            stats["extract"] += time.time() - processing_start
+            if cache:
+                cache.put("pages", url, text, etag=page["etag"], last_modified=page["last_modified"])
+        print(f"Fetched {url} in {page['elapsed']:.2f}s")
+        use_page(url, text)
+        processing += time.time() - processing_start
+    # Fetch time is the time spent waiting on pages, not processing the ones that already arrived
+    stats["fetch"] = time.time() - fetch_start - processing
+
+    # Add results to search output
+    for url in urls:
+        text = results.get(url, "Page did not load in time")
+        search_output += f"""
+        URL: {url}
+        CONTENT:
+        {text}
+        """
 
     end_time = time.time()
+    stats["total"] = end_time - start_time
     print(f"Total time: {end_time - start_time}")
+    if cache:
+        print(f"Search cache: {cache.stats}, hit rate {cache.hit_rate():.0%}")
 
-    return search_output
\ No newline at end of file
+    return search_output
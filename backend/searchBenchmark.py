@@ -0,0 +1,84 @@
+"""
+Benchmark for the search path.
+
+Replays the queries recorded in the local search corpus through search() and reports end-to-end latency, per-stage
+timings and bytes moved. Recording a corpus is the only step that touches the network:
+
+    python searchBenchmark.py record "how do vaccines work" "python asyncio tutorial"
+    python searchBenchmark.py run                      # pages served straight from disk
+    python searchBenchmark.py run --fixture --latency 0.2   # pages served over local HTTP with artificial latency
+    python searchBenchmark.py run --warm               # second pass through a warm cache
+"""
+
+import argparse
+import time
+import numpy as np
+from searching.cache import SearchCache
+from searching.providers import LocalCorpus, LocalSearchProvider, get_provider, SEARCH_CORPUS_DIR
+from scrapeTest import search
+
+STAGES = ("results", "fetch", "extract", "prefilter", "dedupe", "total")
+
+
+def record(queries, corpus_dir=SEARCH_CORPUS_DIR, provider_name="google"):
+    """Run live searches and store their results and raw pages in the corpus"""
+    corpus = LocalCorpus(corpus_dir)
+    provider = get_provider(provider_name)
+    for query in queries:
+        results = provider.search(query)
+        pages = {page["url"]: page["html"] for page in provider.fetch_pages([result["link"] for result in results])}
+        corpus.record(query, results, pages)
+        print(f"Recorded {query!r}: {len(results)} results, {sum(page is not None for page in pages.values())} pages")
+
+
+def run(corpus_dir=SEARCH_CORPUS_DIR, fixture=False, latency=0.0, repeat=3, warm=False, prefilter=True):
+    """Replay every recorded query and print latency and per-stage timings"""
+    corpus = LocalCorpus(corpus_dir)
+    if not corpus.queries:
+        print(f"No recorded queries in {corpus_dir}, record some first")
+        return None
+
+    provider = LocalSearchProvider(corpus, fixture_server=fixture, latency=latency)
+    runs = []
+    try:
+        for query_key, results in corpus.queries.items():
+            for _ in range(repeat):
+                # A fresh in-memory cache per run measures the cold path; --warm measures a second search of the same query
+                cache = SearchCache(":memory:") if warm else None
+                if warm:
+                    search(query_key, None, provider=provider, cache=cache)
+                stats = {}
+                output = search(query_key, None, provider=provider, cache=cache, prefilter=prefilter, stats=stats)
+                stats["output_chars"] = len(output)
+                runs.append(stats)
+    finally:
+        provider.close()
+
+    print(f"\n{len(corpus.queries)} queries x {repeat} runs ({'fixture server' if fixture else 'disk'}, {'warm' if warm else 'cold'} cache)")
+    for stage in STAGES:
+        values = np.array([stats.get(stage, 0.0) for stats in runs]) * 1000
+        print(f"{stage:>10}: p50 {np.percentile(values, 50):8.1f} ms   p95 {np.percentile(values, 95):8.1f} ms   mean {values.mean():8.1f} ms")
+    print(f"{'bytes':>10}: {np.mean([stats['bytes'] for stats in runs]):,.0f} fetched per search")
+    print(f"{'output':>10}: {np.mean([stats['output_chars'] for stats in runs]):,.0f} characters per search")
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay search benchmarks")
+    parser.add_argument("command", choices=["record", "run"])
+    parser.add_argument("queries", nargs="*")
+    parser.add_argument("--corpus", default=SEARCH_CORPUS_DIR)
+    parser.add_argument("--provider", default="google", help="provider used for recording")
+    parser.add_argument("--fixture", action="store_true", help="serve pages through a local HTTP server")
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial latency per page in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warm", action="store_true")
+    parser.add_argument("--no-prefilter", action="store_true")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.command == "record":
+        record(args.queries, args.corpus, args.provider)
+    else:
+        run(args.corpus, args.fixture, args.latency, args.repeat, args.warm, not args.no_prefilter)
+    print(f"Done in {time.time() - start_time:.1f}s")
@@ -0,0 +1,161 @@
+"""
+Two-tier cache for search: query -> result list and url -> extracted page text.
+
+Entries live in a small in-memory LRU in front of a SQLite file, so repeated searches are served without a network call
+across sessions and restarts. Every entry has a TTL. Expired page entries are not thrown away right away: they keep the
+page's ETag / Last-Modified, so the fetcher can revalidate them with a conditional request and reuse the cached text when
+the server answers 304 Not Modified.
+
+The shared cache is opened on first use with get_search_cache() rather than at import time, so importing the search
+modules does not create the SQLite file.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from consts import SEARCH_CACHE_PATH
+
+RESULTS_TTL = float(os.getenv("SEARCH_RESULTS_TTL", 6 * 3600))  # seconds
+PAGES_TTL = float(os.getenv("SEARCH_PAGES_TTL", 24 * 3600))  # seconds
+STALE_TTL = float(os.getenv("SEARCH_STALE_TTL", 7 * 24 * 3600))  # how long expired entries are kept around for revalidation
+MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", 512))
+
+TTLS = {"results": RESULTS_TTL, "pages": PAGES_TTL}
+
+_search_cache = None
+_lock = threading.Lock()
+
+
+def normalize_query(query):
+    """Cache key for a query, so that searches differing only in case, spacing or punctuation share an entry"""
+    words = re.findall(r"\w+", query.lower())
+    return " ".join(words)
+
+
+class SearchCache:
+    def __init__(self, path=SEARCH_CACHE_PATH, memory_entries=MEMORY_ENTRIES, ttls=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "writes": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._db.execute("DELETE FROM entries WHERE expires_at < ?", (time.time() - STALE_TTL,))
+        self._db.commit()
+
+    def get(self, namespace, key, allow_stale=False):
+        """Return the cached entry (a dict with value, etag, last_modified and fresh), or None.
+
+        Expired entries are only returned when allow_stale is set, for conditional revalidation.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is not None:
+                self._memory.move_to_end((namespace, key))
+                source = "memory_hits"
+            else:
+                row = self._db.execute(
+                    "SELECT value, etag, last_modified, stored_at, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, key)).fetchone()
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                entry = {"value": json.loads(row[0]), "etag": row[1], "last_modified": row[2], "stored_at": row[3], "expires_at": row[4]}
+                self._remember((namespace, key), entry)
+                source = "disk_hits"
+
+            fresh = entry["expires_at"] > now
+            if not fresh:
+                self.stats["stale"] += 1
+                if not allow_stale:
+                    return None
+            else:
+                self.stats[source] += 1
+            return dict(entry, fresh=fresh)
+
+    def put(self, namespace, key, value, etag=None, last_modified=None, ttl=None):
+        """Store a value under the namespace's TTL (or the given one)"""
+        now = time.time()
+        entry = {"value": value, "etag": etag, "last_modified": last_modified, "stored_at": now,
+                 "expires_at": now + (ttl if ttl is not None else self.ttls.get(namespace, PAGES_TTL))}
+        with self._lock:
+            self._remember((namespace, key), entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, etag, last_modified, stored_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), etag, last_modified, entry["stored_at"], entry["expires_at"]))
+            self._db.commit()
+            self.stats["writes"] += 1
+
+    def refresh(self, namespace, key, ttl=None):
+        """Extend an entry's TTL after the server confirmed it is unchanged (304 Not Modified)"""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttls.get(namespace, PAGES_TTL))
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is not None:
+                entry["expires_at"] = expires_at
+            self._db.execute("UPDATE entries SET expires_at = ? WHERE namespace = ? AND key = ?", (expires_at, namespace, key))
+            self._db.commit()
+            self.stats["revalidated"] += 1
+
+    def conditional_headers(self, entry):
+        """Request headers that revalidate a cached page"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["revalidated"]
+        lookups = hits + self.stats["misses"] + self.stats["stale"] - self.stats["revalidated"]
+        return hits / lookups if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+def get_search_cache():
+    """Return the shared SearchCache, opening it on the first call"""
+    global _search_cache
+    if _search_cache is None:
+        with _lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
@@ -0,0 +1,111 @@
+"""
+Near-duplicate detection for search results.
+
+Search results often include syndicated or mirrored copies of the same article, and pages repeat the same paragraphs
+(bylines, disclaimers, quoted passages). Two reusable stages collapse them before they reach working memory:
+
+- NearDuplicateFilter compares whole documents by the estimated Jaccard similarity of their word shingles (MinHash)
+- ParagraphFilter drops paragraphs whose SimHash is within a few bits of a paragraph already seen
+
+Both are incremental, so they work on pages as they stream in, and both take a similarity threshold in [0, 1].
+"""
+
+import os
+import re
+import hashlib
+import numpy as np
+
+PAGE_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_PAGE_SIMILARITY_THRESHOLD", 0.8))
+PARAGRAPH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_PARAGRAPH_SIMILARITY_THRESHOLD", 0.9))
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+MIN_SIMHASH_WORDS = 8  # shorter paragraphs are only collapsed when they match exactly
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+WORD = re.compile(r"\w+")
+
+
+def words_of(text):
+    return WORD.findall(text.lower())
+
+
+def shingle_hashes(words, size=SHINGLE_SIZE):
+    """64-bit hashes of the word n-grams of a text"""
+    if len(words) < size:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.array([int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little") for shingle in shingles], dtype=np.uint64)
+
+
+class NearDuplicateFilter:
+    """Remembers documents by MinHash signature and reports when a new one is a near-duplicate of one already seen"""
+
+    def __init__(self, threshold=PAGE_SIMILARITY_THRESHOLD, num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Universal hash functions (a * x + b) mod p over 32-bit shingle hashes, which keeps the products within 64 bits
+        self._a = rng.integers(1, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self.keys = []
+        self._signatures = np.empty((0, num_permutations), dtype=np.uint64)
+
+    def signature(self, text):
+        hashes = shingle_hashes(words_of(text), self.shingle_size) & np.uint64(MAX_HASH)
+        if len(hashes) == 0:
+            return None
+        return ((np.outer(hashes, self._a) + self._b) % np.uint64(MERSENNE_PRIME)).min(axis=0)
+
+    def check(self, key, text):
+        """Return the key of a near-duplicate already seen, or remember this document and return None"""
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        if len(self.keys):
+            similarities = (self._signatures == signature).mean(axis=1)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self.keys[best]
+        self.keys.append(key)
+        self._signatures = np.vstack([self._signatures, signature])
+        return None
+
+
+def simhash(words, size=2):
+    """64-bit SimHash of a text's word n-grams"""
+    hashes = shingle_hashes(words, size)
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.astype(np.int32).sum(axis=0) * 2 - len(hashes)
+    return int(np.packbits((votes > 0)[::-1].astype(np.uint8)).view(">u8")[0])
+
+
+class ParagraphFilter:
+    """Drops paragraphs that are near-duplicates of a paragraph seen earlier, across every text passed through it"""
+
+    def __init__(self, threshold=PARAGRAPH_SIMILARITY_THRESHOLD):
+        self.max_distance = int(round(64 * (1 - threshold)))
+        self._exact = set()
+        self._fingerprints = []
+
+    def is_duplicate(self, paragraph):
+        words = words_of(paragraph)
+        if not words:
+            return False
+        key = " ".join(words)
+        if key in self._exact:
+            return True
+        self._exact.add(key)
+        if len(words) < MIN_SIMHASH_WORDS:
+            return False
+
+        fingerprint = simhash(words)
+        if any((fingerprint ^ seen).bit_count() <= self.max_distance for seen in self._fingerprints):
+            return True
+        self._fingerprints.append(fingerprint)
+        return False
+
+    def filter(self, text):
+        """The text without the paragraphs already seen"""
+        return "\n".join(paragraph for paragraph in text.split("\n") if not self.is_duplicate(paragraph))
@@ -0,0 +1,192 @@
+"""
+HTML-to-text extraction for search results.
+
+The page is parsed incrementally and parsing stops as soon as enough text has been collected, so a huge page costs no
+more than a small one. Text is gathered in blocks (paragraphs, list items, headings, cells), and every block is scored
+so that navigation, footers, cookie banners and other boilerplate are dropped before the text reaches working memory and
+the segmentation prompt. When the page has a <main> or <article> element, only the blocks inside it are kept.
+
+Elements whose class, id or role look like boilerplate ("sidebar", "comments", role="navigation", ...) are not dropped
+outright, since sites put such classes on <body> and page wrappers too. Their blocks are only dropped if the element
+holds less than half of the page's text.
+"""
+
+import os
+import re
+from collections import Counter
+from html.parser import HTMLParser
+
+MAX_PAGE_CHARS = int(os.getenv("SEARCH_MAX_PAGE_CHARS", 20000))  # extracted text kept per page
+FEED_CHUNK_CHARS = 64 * 1024
+SCAN_LIMIT_FACTOR = 4  # stop parsing after this many times max_chars of text, even if most of it may be dropped
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "footer", "aside", "button", "select", "head"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr", "td", "th",
+              "pre", "blockquote", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6", "header", "br", "hr"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+CONTENT_TAGS = {"main", "article"}
+NEVER_BOILERPLATE_TAGS = {"html", "body", "main", "article"}
+VALUE_TAGS = {"td", "th", "li", "dd"}  # short text in these is often the answer (prices, specs, list entries)
+
+BOILERPLATE_ATTRIBUTES = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|cookie|consent|banner|breadcrumbs?|share|social|subscribe|newsletter|"
+    r"promo|advert|ads?|sponsor|popup|modal|related|comments?|signup|login|skip)([\s_-]|$)", re.IGNORECASE)
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alertdialog", "menu", "menubar"}
+BOILERPLATE_TEXT = re.compile(
+    r"\b(cookies?|accept all|privacy policy|terms of (use|service)|all rights reserved|subscribe|sign up|log in|sign in|"
+    r"newsletter|skip to (main )?content|share this|follow us)\b", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_whitespace(text):
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def is_boilerplate(text, link_chars, heading=False, value=False):
+    """Score a block of text and decide whether it is boilerplate rather than content. value is set for the text of table
+    cells and list items, where short fragments are kept unless they are mostly links"""
+    length = len(text)
+    if length == 0:
+        return True
+    # Mostly links: menus, tag clouds, "related articles" lists
+    if link_chars / length > 0.5:
+        return True
+    # Short blocks about cookies, sign ups, copyright and the like
+    if length < 200 and BOILERPLATE_TEXT.search(text):
+        return True
+    # Short fragments without any sentence punctuation are usually labels and buttons, unless they are headings or values
+    if not heading and not value and length < 25 and not re.search(r"[.!?:;]", text):
+        return True
+    return False
+
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor. feed() chunks of HTML until done is set, then call text()"""
+
+    def __init__(self, max_chars=MAX_PAGE_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self._stack = []  # (tag, skipped, suspect id or None) for every open element
+        self._skip_depth = 0
+        self._suspects = []  # ids of the open elements that look like boilerplate
+        self._suspect_ids = 0
+        self._content_depth = 0
+        self._seen_content = False
+        self._parts = []
+        self._link_chars = 0
+        self._in_link = 0
+        self._heading = False
+        self._blocks = []  # (text, inside main/article, ids of the boilerplate-looking elements around it)
+        self._seen_blocks = set()
+        self._chars = 0
+        self._clean_chars = 0  # chars of blocks outside any boilerplate-looking element
+        self._content_chars = 0
+        self._clean_content_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self._flush()
+            return
+        attrs = dict(attrs)
+        skipped = tag in SKIP_TAGS
+        suspect = None
+        if tag not in NEVER_BOILERPLATE_TAGS and (attrs.get("role") in BOILERPLATE_ROLES or attrs.get("aria-hidden") == "true" or
+                                                  BOILERPLATE_ATTRIBUTES.search(f"{attrs.get('class') or ''} {attrs.get('id') or ''}")):
+            suspect = self._suspect_ids
+            self._suspect_ids += 1
+        if tag in BLOCK_TAGS:
+            self._flush()
+        self._stack.append((tag, skipped, suspect))
+        if skipped:
+            self._skip_depth += 1
+        if suspect is not None:
+            self._suspects.append(suspect)
+        if tag in CONTENT_TAGS:
+            self._content_depth += 1
+            self._seen_content = True
+        if tag == "a":
+            self._in_link += 1
+        if tag in HEADING_TAGS:
+            self._heading = True
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or not any(open_tag == tag for open_tag, _, _ in self._stack):
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        # Close everything up to the matching element, since real-world HTML often leaves elements unclosed
+        while self._stack:
+            open_tag, skipped, suspect = self._stack.pop()
+            if skipped:
+                self._skip_depth -= 1
+            if suspect is not None:
+                self._suspects.remove(suspect)
+            if open_tag in CONTENT_TAGS:
+                self._content_depth -= 1
+            if open_tag == "a":
+                self._in_link -= 1
+            if open_tag in BLOCK_TAGS:
+                self._flush()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        self._parts.append(data)
+        if self._in_link:
+            self._link_chars += len(data.strip())
+
+    def _flush(self):
+        heading = self._heading
+        self._heading = False
+        if not self._parts:
+            return
+        text = normalize_whitespace("".join(self._parts))
+        link_chars = self._link_chars
+        self._parts = []
+        self._link_chars = 0
+        value = any(tag in VALUE_TAGS for tag, _, _ in self._stack)
+        if is_boilerplate(text, link_chars, heading, value) or text in self._seen_blocks:
+            return
+        self._seen_blocks.add(text)
+
+        in_content = self._content_depth > 0
+        suspects = tuple(self._suspects)
+        self._blocks.append((text, in_content, suspects))
+        self._chars += len(text)
+        if not suspects:
+            self._clean_chars += len(text)
+        if in_content:
+            self._content_chars += len(text)
+            if not suspects:
+                self._clean_content_chars += len(text)
+        if self._clean_content_chars >= self.max_chars or (not self._seen_content and self._clean_chars >= self.max_chars) or \
+                self._chars >= SCAN_LIMIT_FACTOR * self.max_chars:
+            self.done = True
+
+    def text(self):
+        """The extracted text, blocks separated by newlines and cut to max_chars"""
+        self._flush()
+        blocks = [(text, suspects) for text, in_content, suspects in self._blocks if in_content or not self._content_chars]
+        # Boilerplate-looking elements holding at least half of the text are wrappers of the page, not boilerplate
+        total = sum(len(text) for text, _ in blocks)
+        region_chars = Counter()
+        for text, suspects in blocks:
+            for suspect in suspects:
+                region_chars[suspect] += len(text)
+        kept = [text for text, suspects in blocks if all(region_chars[suspect] * 2 >= total for suspect in suspects)]
+        return "\n".join(kept)[:self.max_chars]
+
+
+def extract_text(html, max_chars=MAX_PAGE_CHARS):
+    """Extract the readable text of an HTML document, stopping once max_chars of content have been collected"""
+    extractor = TextExtractor(max_chars)
+    for start in range(0, len(html), FEED_CHUNK_CHARS):
+        extractor.feed(html[start:start + FEED_CHUNK_CHARS])
+        if extractor.done:
+            break
+    return extractor.text()
@@ -0,0 +1,117 @@
+"""
+Concurrent page fetching for search.
+
+All pages of a search are fetched on the shared event loop through one pooled httpx client. Each host gets a small
+concurrency cap so a search never hammers a single site, every request has its own timeout, and the search as a whole
+has a deadline: pages that have not arrived by then are dropped instead of stalling the caller. Pages are yielded in the
+order they complete, so callers can start working on the fastest ones right away.
+"""
+
+import os
+import time
+import asyncio
+from urllib.parse import urlsplit
+import httpx
+from helper.async_loop import run_on_loop, iterate_sync
+
+FETCH_TIMEOUT = float(os.getenv("SEARCH_FETCH_TIMEOUT", 8))  # seconds per page
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", 12))  # seconds for all pages of one search
+PER_HOST_LIMIT = int(os.getenv("SEARCH_PER_HOST_LIMIT", 2))
+MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", 32))
+MAX_PAGE_BYTES = int(os.getenv("SEARCH_MAX_PAGE_BYTES", 2 * 1024 * 1024))  # bodies are cut off after this many bytes
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class PageFetcher:
+    def __init__(self, timeout=FETCH_TIMEOUT, per_host_limit=PER_HOST_LIMIT, max_connections=MAX_CONNECTIONS, max_bytes=MAX_PAGE_BYTES):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.per_host_limit = per_host_limit
+        self.max_connections = max_connections
+        # Built lazily on the shared loop, since the client and semaphores belong to the loop that created them
+        self._client = None
+        self._host_semaphores = {}
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def _host_semaphore(self, host):
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    def request_url(self, url):
+        """The URL actually requested for a page; proxies and scraping APIs override this"""
+        return url
+
+    async def fetch(self, url, headers=None):
+        """Fetch one page. Never raises: failures are reported in the page's error field.
+
+        headers can carry If-None-Match / If-Modified-Since, in which case a 304 comes back with no html.
+        """
+        start_time = time.monotonic()
+        page = {"url": url, "status": None, "html": None, "error": None, "etag": None, "last_modified": None,
+                "bytes": 0, "truncated": False, "elapsed": 0.0}
+        try:
+            async with self._host_semaphore(host_of(url)):
+                async with self._http().stream("GET", self.request_url(url), headers=headers) as response:
+                    page["status"] = response.status_code
+                    page["etag"] = response.headers.get("etag")
+                    page["last_modified"] = response.headers.get("last-modified")
+                    if response.status_code >= 400:
+                        page["error"] = f"HTTP {response.status_code}"
+                    elif response.status_code != 304:
+                        # Stop reading once the byte budget is spent instead of downloading arbitrarily large pages
+                        body = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            body += chunk
+                            if len(body) >= self.max_bytes:
+                                page["truncated"] = True
+                                break
+                        page["bytes"] = len(body)
+                        page["html"] = bytes(body[:self.max_bytes]).decode(response.charset_encoding or "utf-8", errors="replace")
+        except Exception as e:
+            page["error"] = f"{e.__class__.__name__}: {e}"
+        page["elapsed"] = time.monotonic() - start_time
+        return page
+
+    async def fetch_all(self, urls, deadline=SEARCH_DEADLINE, headers=None):
+        """Yield pages as they complete; pages still pending when the deadline passes are cancelled and left out.
+
+        headers optionally maps a url to extra request headers for it.
+        """
+        headers = headers or {}
+        tasks = [asyncio.ensure_future(run_on_loop(self.fetch(url, headers.get(url)))) for url in dict.fromkeys(urls)]
+        try:
+            for next_page in asyncio.as_completed(tasks, timeout=deadline):
+                yield await next_page
+        except TimeoutError:
+            pending = [task for task in tasks if not task.done()]
+            print(f"Search deadline of {deadline:g}s reached, dropping {len(pending)} pages")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def fetch_all_sync(self, urls, deadline=SEARCH_DEADLINE, headers=None):
+        """Generator version of fetch_all for the threaded parts of the backend"""
+        return iterate_sync(self.fetch_all(urls, deadline, headers))
+
+
+page_fetcher = PageFetcher()
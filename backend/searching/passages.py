@@ -0,0 +1,83 @@
+"""
+Query-aware passage selection for fetched pages.
+
+A page is split into passages of a few paragraphs, every passage is scored against the search query, and only the best
+ones are kept (in their original order) for working memory and segmentation. The score mixes the cosine similarity of
+batch-computed embeddings with a BM25 lexical score, so passages that use the query's exact terms (names, numbers,
+product codes) are not lost when the embedding is vague about them.
+"""
+
+import os
+import re
+import math
+from collections import Counter
+import numpy as np
+from helper.embeddings import encode, encode_batch
+from memory.embedding_index import normalize
+
+PASSAGE_CHARS = int(os.getenv("SEARCH_PASSAGE_CHARS", 600))
+PASSAGES_PER_PAGE = int(os.getenv("SEARCH_PASSAGES_PER_PAGE", 8))
+SEMANTIC_WEIGHT = 0.7  # the rest of the score is BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def split_passages(text, passage_chars=PASSAGE_CHARS):
+    """Group consecutive paragraphs into passages of roughly passage_chars characters"""
+    passages = []
+    current = ""
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > passage_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(query, passages, k1=BM25_K1, b=BM25_B):
+    """BM25 score of every passage for the query, treating the passages as the corpus"""
+    documents = [Counter(tokenize(passage)) for passage in passages]
+    lengths = np.array([sum(document.values()) for document in documents], dtype=np.float32)
+    average_length = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+    scores = np.zeros(len(passages), dtype=np.float32)
+    for term in set(tokenize(query)):
+        frequencies = np.array([document.get(term, 0) for document in documents], dtype=np.float32)
+        containing = np.count_nonzero(frequencies)
+        if not containing:
+            continue
+        idf = math.log(1 + (len(passages) - containing + 0.5) / (containing + 0.5))
+        scores += idf * frequencies * (k1 + 1) / (frequencies + k1 * (1 - b + b * lengths / average_length))
+    return scores
+
+
+def score_passages(query, passages, semantic_weight=SEMANTIC_WEIGHT, query_embedding=None):
+    """Combined semantic and lexical relevance of every passage to the query, in [0, 1]"""
+    if query_embedding is None:
+        query_embedding = encode(query)
+    semantic = normalize(encode_batch(passages)) @ normalize(query_embedding)
+    semantic = (semantic + 1) / 2
+    lexical = bm25_scores(query, passages)
+    if lexical.max() > 0:
+        lexical = lexical / lexical.max()
+    return semantic_weight * semantic + (1 - semantic_weight) * lexical
+
+
+def select_passages(query, text, top_k=PASSAGES_PER_PAGE, passage_chars=PASSAGE_CHARS, query_embedding=None):
+    """Keep the top_k passages of text most relevant to the query, in the order they appear in the text"""
+    passages = split_passages(text, passage_chars)
+    if len(passages) <= top_k:
+        return "\n".join(passages)
+    scores = score_passages(query, passages, query_embedding=query_embedding)
+    keep = sorted(np.argsort(-scores)[:top_k])
+    return "\n".join(passages[i] for i in keep)
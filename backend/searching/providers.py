@@ -0,0 +1,227 @@
+"""
+Search providers: where result lists come from and how their pages are fetched.
+
+- google: Google Custom Search for results, pages fetched directly
+- scrapingbee: Google Custom Search for results, pages fetched through the ScrapingBee API (JS rendering, proxies)
+- local: an offline corpus of recorded queries and pages on disk, served either straight from disk or through a local
+  fixture HTTP server so the real fetch path is exercised
+
+The provider is picked with the SEARCH_PROVIDER environment variable. The local provider is what searchBenchmark.py
+replays against, so the search path can be measured without touching the network.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import dotenv
+from searching.fetcher import PageFetcher, page_fetcher, SEARCH_DEADLINE
+from searching.cache import normalize_query
+
+dotenv.load_dotenv()
+
+SEARCH_PROVIDER = os.getenv("SEARCH_PROVIDER", "google")
+SEARCH_CORPUS_DIR = os.getenv("SEARCH_CORPUS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "search_corpus"))
+RESULTS_TIMEOUT = float(os.getenv("SEARCH_RESULTS_TIMEOUT", 5))  # seconds for the result list request
+NUM_RESULTS = 5
+
+
+class SearchProvider:
+    """A source of search results plus the fetcher used for their pages"""
+    name = None
+
+    def __init__(self, fetcher=None):
+        self.fetcher = fetcher or page_fetcher
+
+    def search(self, query, limit=NUM_RESULTS):
+        """Return up to limit results as [{"link", "title"}]"""
+        raise NotImplementedError
+
+    def fetch_pages(self, urls, deadline=SEARCH_DEADLINE, headers=None):
+        """Yield fetched pages (see PageFetcher.fetch) as they complete"""
+        return self.fetcher.fetch_all_sync(urls, deadline=deadline, headers=headers)
+
+
+class GoogleSearchProvider(SearchProvider):
+    name = "google"
+    url = "https://www.googleapis.com/customsearch/v1"
+
+    def search(self, query, limit=NUM_RESULTS):
+        params = {
+            "key": os.getenv("GOOGLE_SEARCH_API_KEY"),
+            "cx": os.getenv("GOOGLE_CUSTOM_SEARCH_ENGINE_ID"),
+            "q": query,
+        }
+        response = requests.get(self.url, params=params, timeout=RESULTS_TIMEOUT)
+        if response.status_code != 200:
+            print(f"Failed to retrieve search results, status code: {response.status_code}")
+            return []
+        return [{"link": item.get('link'), "title": item.get('title')} for item in response.json().get('items', [])[:limit]]
+
+
+class ScrapingBeeFetcher(PageFetcher):
+    """Fetches pages through the ScrapingBee API instead of directly"""
+    api_url = "https://app.scrapingbee.com/api/v1/"
+
+    def __init__(self, api_key=None, render_js=False, **kwargs):
+        # ScrapingBee renders pages server side, which takes much longer than a direct request
+        kwargs.setdefault("timeout", 30)
+        super().__init__(**kwargs)
+        self.api_key = api_key or os.getenv("SCRAPINGBEE_API_KEY")
+        self.render_js = render_js
+
+    def request_url(self, url):
+        return f"{self.api_url}?{urlencode({'api_key': self.api_key, 'url': url, 'render_js': str(self.render_js).lower()})}"
+
+
+class ScrapingBeeProvider(GoogleSearchProvider):
+    name = "scrapingbee"
+
+    def __init__(self, fetcher=None):
+        super().__init__(fetcher or ScrapingBeeFetcher())
+
+
+def page_filename(url):
+    return hashlib.sha1(url.encode()).hexdigest() + ".html"
+
+
+class LocalCorpus:
+    """Recorded queries and pages on disk: queries.json maps a normalized query to its results, pages/ holds the HTML"""
+
+    def __init__(self, path=SEARCH_CORPUS_DIR):
+        self.path = path
+        self.pages_dir = os.path.join(path, "pages")
+        queries_path = os.path.join(path, "queries.json")
+        self.queries = {}
+        if os.path.exists(queries_path):
+            with open(queries_path) as f:
+                self.queries = json.load(f)
+
+    def results(self, query):
+        return self.queries.get(normalize_query(query), [])
+
+    def page(self, url):
+        """The recorded HTML of a page, or None"""
+        try:
+            with open(os.path.join(self.pages_dir, page_filename(url)), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def record(self, query, results, pages):
+        """Store a query's results and the HTML of its pages (url -> html)"""
+        os.makedirs(self.pages_dir, exist_ok=True)
+        for url, html in pages.items():
+            if html is not None:
+                with open(os.path.join(self.pages_dir, page_filename(url)), "w", encoding="utf-8") as f:
+                    f.write(html)
+        self.queries[normalize_query(query)] = results
+        with open(os.path.join(self.path, "queries.json"), "w") as f:
+            json.dump(self.queries, f, indent=2)
+
+
+class CorpusFetcher:
+    """Serves pages straight from a LocalCorpus, in the same shape as PageFetcher"""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def fetch_all_sync(self, urls, deadline=SEARCH_DEADLINE, headers=None):
+        for url in dict.fromkeys(urls):
+            start_time = time.monotonic()
+            html = self.corpus.page(url)
+            yield {"url": url, "status": 200 if html is not None else 404, "html": html,
+                   "error": None if html is not None else "HTTP 404", "etag": None, "last_modified": None,
+                   "bytes": len(html.encode()) if html else 0, "truncated": False, "elapsed": time.monotonic() - start_time}
+
+
+class CorpusServer:
+    """A local HTTP server for a LocalCorpus. Pages are served at /<original url>, with an optional artificial latency"""
+
+    def __init__(self, corpus, latency=0.0, port=0):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                html = corpus.page(self.path[1:])
+                time.sleep(latency)
+                if html is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = html.encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url_for(self, url):
+        return self.base_url + url
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FixtureFetcher(PageFetcher):
+    """Fetches corpus pages over HTTP from a CorpusServer, so timings include the real fetch path"""
+
+    def __init__(self, server, **kwargs):
+        # Every page comes from the same local host, so the per-host cap would otherwise serialize them
+        kwargs.setdefault("per_host_limit", NUM_RESULTS)
+        super().__init__(**kwargs)
+        self.server = server
+
+    def request_url(self, url):
+        return self.server.url_for(url)
+
+
+class LocalSearchProvider(SearchProvider):
+    name = "local"
+
+    def __init__(self, corpus=None, fixture_server=False, latency=0.0):
+        self.corpus = corpus if isinstance(corpus, LocalCorpus) else LocalCorpus(corpus or SEARCH_CORPUS_DIR)
+        self.server = CorpusServer(self.corpus, latency) if fixture_server else None
+        super().__init__(FixtureFetcher(self.server) if self.server else CorpusFetcher(self.corpus))
+
+    def search(self, query, limit=NUM_RESULTS):
+        return self.corpus.results(query)[:limit]
+
+    def close(self):
+        if self.server:
+            self.server.close()
+
+
+PROVIDERS = {
+    "google": GoogleSearchProvider,
+    "scrapingbee": ScrapingBeeProvider,
+    "local": LocalSearchProvider,
+}
+
+_providers = {}
+
+
+def get_provider(name=None):
+    """The shared provider instance for a name (SEARCH_PROVIDER by default)"""
+    name = name or SEARCH_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown search provider: {name}")
+    if name not in _providers:
+        _providers[name] = PROVIDERS[name]()
+    return _providers[name]
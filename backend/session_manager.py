@@ -0,0 +1,101 @@
+"""
+Keeps one Agent per client so that concurrent users never share working memory.
+
+Agents are keyed by user id when the client sends one, and by socket sid otherwise. The pool is bounded:
+- at most max_agents agents are alive; creating one more evicts the least recently used idle agent
+- agents that have not been used for idle_ttl seconds are evicted by a background thread
+- at most max_decision_loops decision loops run at the same time across all agents
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+MAX_AGENTS = int(os.getenv("MAX_AGENTS", 64))
+AGENT_IDLE_TTL = int(os.getenv("AGENT_IDLE_TTL", 30 * 60))
+MAX_DECISION_LOOPS = int(os.getenv("MAX_DECISION_LOOPS", 8))
+EVICTION_INTERVAL = 60
+
+
+class SessionManager:
+    def __init__(self, agent_factory, max_agents=MAX_AGENTS, idle_ttl=AGENT_IDLE_TTL, max_decision_loops=MAX_DECISION_LOOPS):
+        """agent_factory(key) builds a new agent for a session key, with its callbacks wired to that session"""
+        self.agent_factory = agent_factory
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+        self.decision_semaphore = threading.BoundedSemaphore(max_decision_loops)
+        self._agents = OrderedDict()  # key -> agent, least recently used first
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+        self._eviction_thread = threading.Thread(target=self._evict_idle_loop, daemon=True)
+        self._eviction_thread.start()
+
+    def __len__(self):
+        return len(self._agents)
+
+    def get(self, key):
+        """Return the agent for a session key, creating it (and evicting others if the pool is full) when needed"""
+        evicted = []
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is None:
+                evicted = self._make_room()
+                agent = self.agent_factory(key)
+                agent.decision_semaphore = self.decision_semaphore
+                self._agents[key] = agent
+                print(f"Created agent for session {key} ({len(self._agents)} live)")
+            self._agents.move_to_end(key)
+            self._last_used[key] = time.time()
+
+        for old_agent in evicted:
+            old_agent.shutdown()
+        return agent
+
+    def peek(self, key):
+        """Return the agent for a session key without creating one or refreshing its last use"""
+        with self._lock:
+            return self._agents.get(key)
+
+    def remove(self, key):
+        """Remove and shut down the agent of a session, if there is one"""
+        with self._lock:
+            agent = self._agents.pop(key, None)
+            self._last_used.pop(key, None)
+        if agent is not None:
+            agent.shutdown()
+            print(f"Removed agent for session {key}")
+
+    def _make_room(self):
+        """Evict least recently used agents until there is room for one more; busy agents are only evicted as a last resort"""
+        evicted = []
+        while len(self._agents) >= self.max_agents:
+            victim = next((key for key, agent in self._agents.items() if not agent.decision_loop_running), None)
+            if victim is None:
+                victim = next(iter(self._agents))
+            evicted.append(self._agents.pop(victim))
+            self._last_used.pop(victim, None)
+            print(f"Evicted agent for session {victim} (pool full)")
+        return evicted
+
+    def evict_idle(self):
+        """Shut down every agent that has been idle for longer than the TTL and is not in the middle of a decision loop"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key in list(self._agents):
+                agent = self._agents[key]
+                if now - self._last_used[key] > self.idle_ttl and not agent.decision_loop_running:
+                    evicted.append((key, self._agents.pop(key)))
+                    self._last_used.pop(key, None)
+        for key, agent in evicted:
+            agent.shutdown()
+            print(f"Evicted idle agent for session {key}")
+        return len(evicted)
+
+    def _evict_idle_loop(self):
+        """Background thread that periodically evicts idle agents"""
+        while True:
+            time.sleep(EVICTION_INTERVAL)
+            self.evict_idle()
@@ -0,0 +1,12 @@
+import os
+import sys
+import types
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# backend/memory.py would shadow the memory/ package directory, so point the package name at the directory
+if "memory" not in sys.modules:
+    memory_package = types.ModuleType("memory")
+    memory_package.__path__ = [os.path.join(BACKEND_DIR, "memory")]
+    sys.modules["memory"] = memory_package
@@ -0,0 +1,81 @@
+import numpy as np
+from memory.ann_index import IVFIndex
+from memory.embedding_index import normalize
+from memory.vector_store import VectorStore
+
+
+def clustered_vectors(n, dim=32, n_clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.normal(size=(n_clusters, dim)))
+    return normalize(centers[rng.integers(n_clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)) / np.sqrt(dim)).astype(np.float32), centers
+
+
+def build(path, n=4000, seed=0):
+    vectors, centers = clustered_vectors(n, seed=seed)
+    store = VectorStore(str(path))
+    store.add_batch([f"memory {i}" for i in range(n)], vectors)
+    index = IVFIndex(store, min_train_size=1000, background=False)
+    index.sync()
+    return store, index, centers
+
+
+def test_recall_against_exact_search(tmp_path):
+    store, index, centers = build(tmp_path)
+    assert index.is_trained
+    rng = np.random.default_rng(1)
+    queries = normalize(centers[rng.integers(len(centers), size=50)] + 0.3 * rng.normal(size=(50, centers.shape[1])) / np.sqrt(centers.shape[1]))
+    recalls = []
+    for query in queries:
+        exact = {i for i, _ in store.exact_search(query, limit=10)}
+        approximate = {i for i, _ in index.search(query, limit=10)}
+        recalls.append(len(exact & approximate) / len(exact))
+    assert np.mean(recalls) >= 0.95
+    store.close()
+
+
+def test_probing_every_list_is_exact(tmp_path):
+    store, index, _ = build(tmp_path)
+    query = store.embeddings()[123]
+    assert index.search(query, limit=5, n_probe=index.n_lists) == store.exact_search(query, limit=5)
+    store.close()
+
+
+def test_clustered_index_is_calibrated_to_probe_few_lists(tmp_path):
+    store, index, _ = build(tmp_path)
+    assert index.tuned_n_probe is not None
+    assert index.tuned_n_probe <= index.n_lists * 0.2
+    store.close()
+
+
+def test_unclustered_index_falls_back_to_exact_search(tmp_path):
+    rng = np.random.default_rng(0)
+    store = VectorStore(str(tmp_path))
+    store.add_batch([""] * 3000, normalize(rng.normal(size=(3000, 32))).astype(np.float32))
+    index = IVFIndex(store, min_train_size=1000, background=False)
+    index.sync()
+    # Uniformly random vectors are the worst case for IVF: the target recall needs most lists, so searches are exact
+    assert index.is_trained and index.tuned_n_probe is None
+    query = normalize(rng.normal(size=32))
+    assert index.search(query, limit=5) is None
+    assert store.search(query, limit=5) == store.exact_search(query, limit=5)
+    assert index.search(query, limit=5, n_probe=2) is not None
+    store.close()
+
+
+def test_tombstones_survive_reopen(tmp_path):
+    store, index, _ = build(tmp_path)
+    query = store.embeddings()[42].copy()
+    assert index.search(query, limit=1)[0][0] == 42
+    store.delete(42)
+    assert 42 not in {i for i, _ in index.search(query, limit=10)}
+    generation = index.generation
+    store.close()
+
+    store = VectorStore(str(tmp_path))
+    index = IVFIndex(store, min_train_size=1000, background=False)
+    assert index.is_trained and index.generation == generation  # reopened without retraining
+    assert index.tuned_n_probe is not None
+    assert store.is_deleted(42)
+    assert 42 not in {i for i, _ in index.search(query, limit=10)}
+    assert 42 not in {i for i, _ in store.exact_search(query, limit=10)}
+    store.close()
@@ -0,0 +1,36 @@
+from searching.dedupe import NearDuplicateFilter, ParagraphFilter, simhash, words_of
+
+ARTICLE = ("The city council approved the new transit plan on Tuesday after months of debate. The plan adds three bus "
+           "lines, extends the light rail to the airport and lowers fares for students and seniors. Construction is "
+           "expected to start next spring and finish within four years, according to the mayor's office.")
+
+
+def test_mirrored_pages_are_near_duplicates():
+    pages = NearDuplicateFilter()
+    assert pages.check("original", ARTICLE) is None
+    assert pages.check("mirror", ARTICLE.replace("Tuesday", "Wednesday") + " Share this article.") == "original"
+    assert pages.check("other", "A recipe for sourdough bread needs flour, water, salt and a lot of patience over two days.") is None
+    assert pages.keys == ["original", "other"]
+    assert pages.check("empty", "") is None
+
+
+def test_repeated_paragraphs_are_dropped():
+    paragraphs = ParagraphFilter()
+    first = paragraphs.filter(f"Byline: Staff\n{ARTICLE}\nShort one")
+    assert first.split("\n") == ["Byline: Staff", ARTICLE, "Short one"]
+    second = paragraphs.filter(f"byline staff\n{ARTICLE.replace('Tuesday', 'Monday')}\nA different paragraph entirely, about gardening and tomatoes.")
+    assert second.split("\n") == ["A different paragraph entirely, about gardening and tomatoes."]
+
+
+def test_short_paragraphs_only_match_exactly():
+    paragraphs = ParagraphFilter()
+    assert not paragraphs.is_duplicate("Read more today")
+    assert not paragraphs.is_duplicate("Read more tomorrow")
+    assert paragraphs.is_duplicate("read more, today!")
+
+
+def test_simhash_is_close_for_similar_text():
+    a = simhash(words_of(ARTICLE))
+    b = simhash(words_of(ARTICLE.replace("Tuesday", "Monday")))
+    c = simhash(words_of("Completely unrelated text about the migration of birds across the northern hemisphere each autumn."))
+    assert (a ^ b).bit_count() < (a ^ c).bit_count()
@@ -0,0 +1,66 @@
+import pytest
+from browsing.element_index import ElementIndex, parse_element_id, ID_ATTRIBUTE
+
+
+class FakePage:
+    main_frame = object()
+    url = "https://example.com"
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.selectors = []
+
+    def on(self, event, handler):
+        pass
+
+    def evaluate(self, script, args):
+        return self.elements
+
+    def locator(self, selector):
+        self.selectors.append(selector)
+        return type("Locator", (), {"first": selector})()
+
+
+ELEMENTS = [
+    {"id": 3, "role": "textbox", "name": "Search", "value": "tacos", "checked": None, "disabled": False,
+     "box": {"x": 100, "y": 20, "width": 200, "height": 30}},
+    {"id": 7, "role": "button", "name": "Go", "value": None, "checked": None, "disabled": True,
+     "box": {"x": 310, "y": 20, "width": 40, "height": 30}},
+]
+
+
+@pytest.mark.parametrize("text", ["12", "[12]", " [12] ", "#12"])
+def test_parse_element_id(text):
+    assert parse_element_id(text) == 12
+
+
+@pytest.mark.parametrize("text", ["", "[]", "twelve", "12px"])
+def test_parse_element_id_rejects_non_ids(text):
+    with pytest.raises(ValueError):
+        parse_element_id(text)
+
+
+def test_describe_and_locate():
+    page = FakePage(ELEMENTS)
+    index = ElementIndex(page)
+    index.refresh()
+    lines = index.describe().splitlines()
+    assert lines[0].startswith('[3] textbox "Search"') and 'value "tacos"' in lines[0]
+    assert lines[1].endswith("disabled")
+    assert index.locator("[7]") == f'[{ID_ATTRIBUTE}="7"]'
+    assert index.center("[3]") == {"x": 200, "y": 35}
+
+
+def test_unknown_element():
+    index = ElementIndex(FakePage(ELEMENTS))
+    index.refresh()
+    with pytest.raises(KeyError):
+        index.locator("[99]")
+
+
+def test_unchanged_page_keeps_index():
+    page = FakePage(ELEMENTS)
+    index = ElementIndex(page)
+    index.refresh()
+    page.elements = None  # the page script reports no change
+    assert set(index.refresh()) == {3, 7}
@@ -0,0 +1,48 @@
+import numpy as np
+from memory.embedding_index import EmbeddingIndex, normalize
+
+
+def test_normalize_handles_zero_vectors():
+    vectors = normalize([[3.0, 4.0], [0.0, 0.0]])
+    assert np.allclose(vectors, [[0.6, 0.8], [0.0, 0.0]])
+    assert vectors.dtype == np.float32
+
+
+def test_add_grows_past_the_initial_capacity():
+    index = EmbeddingIndex(initial_capacity=2)
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(10, 8))
+    for i, embedding in enumerate(embeddings):
+        index.add(f"key {i}", embedding)
+    assert len(index) == 10 and "key 9" in index
+    assert np.allclose(index.matrix, normalize(embeddings))
+
+
+def test_add_replaces_existing_keys():
+    index = EmbeddingIndex()
+    index.add_batch(["a", "b"], np.eye(3)[:2])
+    index.add_batch(["b", "c"], np.eye(3)[[2, 1]])
+    assert index.keys == ["a", "b", "c"]
+    assert np.allclose(index.matrix, np.eye(3)[[0, 2, 1]])
+
+
+def test_similarities_and_best_match():
+    index = EmbeddingIndex()
+    assert index.similarities(np.ones(3)).shape == (0,)
+    assert index.best_match(np.ones(3), 0.5) == (None, 0.0)
+
+    index.add_batch(["x", "y"], np.eye(3)[:2] * 5)
+    assert np.allclose(index.similarities(np.eye(3)), [[1, 0], [0, 1], [0, 0]])
+    key, score = index.best_match([1.0, 0.1, 0.0], 0.9)
+    assert key == "x" and score > 0.99
+    key, score = index.best_match([1.0, 1.0, 0.0], 0.9)
+    assert key is None and np.isclose(score, np.sqrt(0.5))
+
+
+def test_clear_keeps_the_index_usable():
+    index = EmbeddingIndex()
+    index.add("a", [1.0, 0.0])
+    index.clear()
+    assert len(index) == 0 and "a" not in index
+    index.add("b", [0.0, 1.0])
+    assert index.best_match([0.0, 1.0], 0.9)[0] == "b"
@@ -0,0 +1,65 @@
+from searching.extraction import extract_text, TextExtractor
+
+PARAGRAPH = "<p>Vaccines train the immune system to recognise a pathogen without causing the disease itself. </p>"
+ARTICLE = "".join(PARAGRAPH.replace("Vaccines", f"Vaccines ({i})") for i in range(5))
+
+
+def test_plain_page():
+    text = extract_text(f"<html><body>{ARTICLE}</body></html>")
+    assert text.count("Vaccines") == 5
+
+
+def test_boilerplate_classes_on_body_keep_the_page():
+    for body_class in ["home page-template has-sidebar", "single-post header-sticky", "no-js menu-closed"]:
+        text = extract_text(f'<html><body class="{body_class}">{ARTICLE}</body></html>')
+        assert text.count("Vaccines") == 5, body_class
+
+
+def test_boilerplate_class_on_page_wrapper_keeps_the_page():
+    text = extract_text(f'<html><body><div class="site-content has-comments">{ARTICLE}</div></body></html>')
+    assert text.count("Vaccines") == 5
+
+
+def test_page_inside_form_is_kept():
+    text = extract_text(f'<html><body><form id="aspnetForm">{ARTICLE}</form></body></html>')
+    assert text.count("Vaccines") == 5
+
+
+def test_small_boilerplate_blocks_are_dropped():
+    html = (f'<html><body>{ARTICLE}'
+            '<div class="sidebar"><p>Sidebar teaser text that is long enough to be a block.</p></div>'
+            '<div role="navigation"><p>Navigation text that is long enough to be a block.</p></div>'
+            '<nav><p>Menu text inside a nav element, long enough to be a block.</p></nav></body></html>')
+    text = extract_text(html)
+    assert text.count("Vaccines") == 5
+    assert "Sidebar" not in text and "Navigation" not in text and "Menu" not in text
+
+
+def test_main_content_preferred():
+    html = f"<html><body><div><p>Some text outside the main element of the page.</p></div><main>{ARTICLE}</main></body></html>"
+    text = extract_text(html)
+    assert "outside" not in text and text.count("Vaccines") == 5
+
+
+def test_stops_early_on_huge_pages():
+    extractor = TextExtractor(max_chars=1000)
+    extractor.feed("<html><body>" + "".join(PARAGRAPH.replace("Vaccines", f"Vaccines ({i})") for i in range(1000)))
+    assert extractor.done
+    assert len(extractor.text()) <= 1000
+
+
+def test_short_table_cells_and_list_items_are_kept():
+    html = (f"<html><body>{ARTICLE}"
+            "<table><tr><th>Dose</th><td>0.5 ml</td></tr><tr><th>Price</th><td>$24.99</td></tr></table>"
+            "<ul><li>Pfizer</li><li>Moderna</li></ul><dl><dt>Term</dt><dd>Booster</dd></dl>"
+            "<div>Buy now</div></body></html>")
+    text = extract_text(html)
+    for value in ["Dose", "0.5 ml", "$24.99", "Pfizer", "Moderna", "Booster"]:
+        assert value in text, value
+    assert "Buy now" not in text
+
+
+def test_short_link_lists_are_still_dropped():
+    html = f'<html><body><ul><li><a href="/">Home</a></li><li><a href="/about">About</a></li></ul>{ARTICLE}</body></html>'
+    text = extract_text(html)
+    assert "Home" not in text and "About" not in text
@@ -0,0 +1,56 @@
+from browsing.html_chunker import strip_noise, chunk_html, rank_chunks, find_in_chunks
+
+
+def test_strip_noise():
+    html = '<html><head><script>var x = "<div>";</script><style>p { color: red }</style></head><body><!-- note --><p>Hi</p></body></html>'
+    stripped = strip_noise(html)
+    assert "script" not in stripped and "color" not in stripped and "note" not in stripped
+    assert "<p>Hi</p>" in stripped
+
+
+def test_chunks_cover_the_document_within_the_limit():
+    html = "<body>" + "".join(f"<div><p>Item {i}</p><button>Buy {i}</button></div>" for i in range(2000)) + "</body>"
+    chunks = chunk_html(html, max_chars=2000)
+    assert "".join(chunks) == html
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    # Cuts happen right before block elements
+    assert all(chunk.startswith(("<div>", "<p>")) for chunk in chunks[1:])
+
+
+def test_long_text_runs_are_split():
+    html = "x" * 5000 + "<p>end</p>"
+    chunks = chunk_html(html, max_chars=2000)
+    assert "".join(chunks) == html
+    assert [len(chunk) for chunk in chunks] == [2000, 2000, 1000 + len("<p>end</p>")]
+
+
+def test_text_without_tags_is_split():
+    chunks = chunk_html("y" * 4500, max_chars=2000)
+    assert [len(chunk) for chunk in chunks] == [2000, 2000, 500]
+
+
+def test_rank_chunks_prefers_matching_text_and_attributes():
+    chunks = ["<div><p>Shipping information</p></div>", '<div><input placeholder="Search courses"></div>', "<div><p>About us</p></div>"]
+    assert rank_chunks("search courses box", chunks)[0] == chunks[1]
+
+
+def test_find_in_chunks_returns_first_match():
+    chunks = [f"<div><p>Section {i}</p></div>" for i in range(10)] + ['<div><button aria-label="Checkout">Pay</button></div>']
+    result = find_in_chunks("checkout button", chunks, lambda chunk: "found" if "Checkout" in chunk else None)
+    assert result == "found"
+
+
+def test_find_in_chunks_falls_back_to_later_batches():
+    chunks = [f"<div><p>checkout step {i}</p></div>" for i in range(10)] + ["<div><p>the real thing</p></div>"]
+    asked = []
+
+    def ask(chunk):
+        asked.append(chunk)
+        return "found" if "real thing" in chunk else None
+
+    assert find_in_chunks("checkout", chunks, ask, batch_size=3) == "found"
+    assert len(asked) == len(chunks)
+
+
+def test_find_in_chunks_without_a_match():
+    assert find_in_chunks("anything", ["<p>a</p>", "<p>b</p>"], lambda chunk: None) is None
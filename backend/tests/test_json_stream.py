@@ -0,0 +1,55 @@
+import json
+from helper.json_stream import StringFieldStream, SegmentStream, parse_segments
+
+
+def feed_in_pieces(stream, text, size=3):
+    return [output for start in range(0, len(text), size) for output in [stream.feed(text[start:start + size])]]
+
+
+def test_string_field_is_decoded_as_it_streams():
+    message = 'Line one\nsaid "hi" \\ café \U0001F600'
+    raw = json.dumps({"thought": "ignore {this}", "nested": {"message": "not me"}, "message": message, "other": "x"})
+    stream = StringFieldStream("message")
+    pieces = feed_in_pieces(stream, raw)
+    assert stream.value == message and stream.complete
+    assert sum(1 for piece in pieces if piece) > 1
+
+
+def test_string_field_before_the_object_is_complete():
+    stream = StringFieldStream("message")
+    assert stream.feed('{"message": "Hel') == "Hel"
+    assert stream.feed('lo\\') == "lo"
+    assert stream.feed('u0021') == "!"
+    assert not stream.complete
+
+
+def test_segments_stream_member_by_member():
+    stream = SegmentStream()
+    assert stream.feed('Here you go: {"alpha": ["a", "b"], ') == [("alpha", ["a", "b"])]
+    assert stream.feed('"beta": 2}') == [("beta", 2)]
+    assert stream.complete
+
+
+def test_array_items_stream_one_by_one():
+    stream = SegmentStream(items_of="segments")
+    assert stream.feed('{"segments": [{"text": "one"}, ') == [{"text": "one"}]
+    assert stream.feed('{"text": "two"}]}') == [{"text": "two"}]
+    assert stream.segments == [{"text": "one"}, {"text": "two"}]
+
+
+def test_truncated_output_keeps_its_complete_part():
+    text = '{"facts": ["first", "second"], "more": ["third", "fourth is cut'
+    assert parse_segments(text) == [("facts", ["first", "second"]), ("more", ["third"])]
+    assert parse_segments('{"segments": ["a", "b", "c is cut', items_of="segments") == ["a", "b"]
+
+
+def test_malformed_segments_only_lose_themselves():
+    assert parse_segments('{"a": 1, "b": nope, "c": 3}') == [("a", 1), ("c", 3)]
+
+
+def test_start_marker_and_stray_braces():
+    text = 'Reasoning about {braces} first.\nOUTPUT:\n{"answer": 42}'
+    assert parse_segments(text, start_after="OUTPUT:") == [("answer", 42)]
+    assert parse_segments('I will use {} then {"answer": 42}') == [("answer", 42)]
+    # Without the marker, the object is still found in the text seen so far
+    assert parse_segments('{"answer": 42}', start_after="OUTPUT:") == [("answer", 42)]
@@ -0,0 +1,80 @@
+import io
+from PIL import Image, ImageDraw
+from browsing.screenshots import FrameTracker, encode, grid_overlay, vision_tokens
+
+SIZE = (800, 600)
+CURSOR = {"x": 400, "y": 300}
+
+
+def screenshot(box=None, color="red"):
+    """PNG bytes of a white page, with a rectangle drawn over box"""
+    image = Image.new("RGB", SIZE, "white")
+    if box:
+        ImageDraw.Draw(image).rectangle(box, fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_encode_returns_a_data_url():
+    assert encode(Image.new("RGB", (10, 10)), format="JPEG").startswith("data:image/jpeg;base64,")
+    assert encode(Image.new("RGB", (10, 10)), format="PNG").startswith("data:image/png;base64,")
+    assert vision_tokens((750, 100)) == 100
+
+
+def test_grid_overlay_is_rendered_once_per_size():
+    assert grid_overlay((800, 600)) is grid_overlay((800, 600))
+    assert grid_overlay((800, 600)).size == (800, 600)
+
+
+def test_first_frame_is_full():
+    tracker = FrameTracker()
+    frames = tracker.frames(screenshot(), CURSOR)
+    assert len(frames) == 1 and frames[0]["text"] == "Current browser screenshot"
+    assert tracker.stats["full"] == 1
+
+
+def test_unchanged_page_reuses_the_previous_frame():
+    tracker = FrameTracker()
+    first = tracker.frames(screenshot(), CURSOR)
+    assert tracker.frames(screenshot(), CURSOR) == first
+    assert tracker.stats["reused"] == 1 and tracker.stats["tokens_saved"] == 0
+
+
+def test_small_change_sends_an_overview_and_a_crop():
+    tracker = FrameTracker()
+    tracker.frames(screenshot(), CURSOR)
+    assert tracker.changed_box(tracker._previous) == ()
+    frames = tracker.frames(screenshot((420, 320, 460, 350)), CURSOR)
+    assert len(frames) == 2
+    assert "changed only between x=416, y=320 and x=480, y=352" in frames[0]["text"]
+    assert "from x=250, y=150 to x=550, y=450" in frames[1]["text"]
+    assert tracker.stats["partial"] == 1 and tracker.stats["tokens_saved"] > 0
+
+
+def test_moving_the_cursor_on_an_unchanged_page_sends_a_crop():
+    tracker = FrameTracker()
+    tracker.frames(screenshot(), CURSOR)
+    frames = tracker.frames(screenshot(), {"x": 100, "y": 100})
+    assert len(frames) == 2 and "has not changed" in frames[0]["text"]
+
+
+def test_large_changes_and_long_runs_of_partial_frames_send_full_frames():
+    tracker = FrameTracker(full_frame_every=2)
+    tracker.frames(screenshot(), CURSOR)
+    assert len(tracker.frames(screenshot((0, 0, 799, 599), "blue"), CURSOR)) == 1
+    assert len(tracker.frames(screenshot(), CURSOR)) == 1
+
+    for i in range(2):
+        assert len(tracker.frames(screenshot((420 + 10 * i, 320, 425 + 10 * i, 325)), CURSOR)) == 2
+    assert len(tracker.frames(screenshot((460, 320, 465, 325)), CURSOR)) == 1
+    assert tracker.stats["full"] == 4 and tracker.stats["partial"] == 2
+
+
+def test_resized_viewport_sends_a_full_frame():
+    tracker = FrameTracker()
+    tracker.frames(screenshot(), CURSOR)
+    image = Image.new("RGB", (1024, 768), "white")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    assert len(tracker.frames(buffer.getvalue(), CURSOR)) == 1
@@ -0,0 +1,44 @@
+import searching.cache as cache_module
+from searching.cache import SearchCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  What is   Python?! ") == normalize_query("what is python")
+
+
+def test_shared_cache_is_opened_lazily(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache" / "search.sqlite3")
+    monkeypatch.setattr(cache_module, "_search_cache", None)
+    monkeypatch.setattr(cache_module, "SearchCache", lambda: SearchCache(path))
+    assert not (tmp_path / "cache").exists()
+    cache = cache_module.get_search_cache()
+    assert cache is cache_module.get_search_cache()
+    assert cache.path == path and (tmp_path / "cache" / "search.sqlite3").exists()
+    cache.close()
+
+
+def test_entries_survive_reopen_and_expire(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    cache = SearchCache(path)
+    cache.put("results", "q", [{"url": "https://example.com"}])
+    cache.put("pages", "https://example.com", "text", etag='"abc"', ttl=-1)
+    cache.close()
+
+    cache = SearchCache(path)
+    assert cache.get("results", "q")["value"] == [{"url": "https://example.com"}]
+    assert cache.stats["disk_hits"] == 1
+    assert cache.get("pages", "https://example.com") is None
+    stale = cache.get("pages", "https://example.com", allow_stale=True)
+    assert not stale["fresh"] and cache.conditional_headers(stale) == {"If-None-Match": '"abc"'}
+    cache.refresh("pages", "https://example.com")
+    assert cache.get("pages", "https://example.com")["fresh"]
+    cache.close()
+
+
+def test_memory_tier_is_bounded():
+    cache = SearchCache(":memory:", memory_entries=2)
+    for i in range(3):
+        cache.put("results", str(i), i)
+    assert len(cache._memory) == 2
+    assert cache.get("results", "0")["value"] == 0
+    assert cache.stats["disk_hits"] == 1
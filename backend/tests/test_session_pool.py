@@ -0,0 +1,98 @@
+from browsing.session_pool import BrowserSessionPool, BrowserSession
+
+
+class FakeBackend:
+    adopts_warm_sessions = True
+
+    def __init__(self):
+        self.created = 0
+        self.closed = []
+        self.profiles = set()
+
+    def has_profile(self, user_key):
+        return user_key in self.profiles
+
+    def create(self, user_key=None):
+        self.created += 1
+        if user_key is not None:
+            self.profiles.add(user_key)
+        return BrowserSession(f"session-{self.created}", "ws://fake", None, user_key)
+
+    def is_alive(self, session):
+        return True
+
+    def close(self, session):
+        self.closed.append(session.id)
+
+
+class ProfileAtCreationBackend(FakeBackend):
+    """Like Browserbase: a session only keeps a user's cookies if it was created with their profile"""
+    adopts_warm_sessions = False
+
+    def __init__(self):
+        super().__init__()
+        self.session_profiles = {}
+
+    def create(self, user_key=None):
+        session = super().create(user_key)
+        self.session_profiles[session.id] = user_key
+        return session
+
+
+def make_pool(backend=None, **kwargs):
+    backend = backend or FakeBackend()
+    return backend, BrowserSessionPool(backend, **kwargs)
+
+
+def test_user_gets_their_session_back():
+    backend, pool = make_pool(max_size=2, warm_sessions=0)
+    session = pool.acquire("alice")
+    pool.release(session)
+    assert pool.acquire("alice") is session
+    assert backend.created == 1
+
+
+def test_users_do_not_share_sessions():
+    backend, pool = make_pool(max_size=2, warm_sessions=0)
+    alice = pool.acquire("alice")
+    pool.release(alice)
+    assert pool.acquire("bob") is not alice
+
+
+def test_throwaway_sessions_are_never_reused():
+    backend, pool = make_pool(max_size=2, warm_sessions=0)
+    first = pool.acquire(None)
+    pool.discard(first)
+    second = pool.acquire(None)
+    assert second is not first
+    assert backend.closed == [first.id]
+    assert second.user_key is None
+
+
+def test_warm_session_is_bound_to_first_user():
+    backend, pool = make_pool(max_size=2, warm_sessions=1)
+    pool.maintain()
+    session = pool.acquire("alice")
+    assert session.user_key == "alice"
+    assert pool.stats["warm_hits"] == 1
+
+
+def test_discarded_session_frees_its_slot():
+    backend, pool = make_pool(max_size=1, warm_sessions=0)
+    session = pool.acquire("alice")
+    pool.discard(session)
+    assert pool.acquire("bob", timeout=1).user_key == "bob"
+
+
+def test_users_get_sessions_with_their_profile_when_warm_ones_cannot_adopt_it():
+    backend, pool = make_pool(ProfileAtCreationBackend(), max_size=3, warm_sessions=1)
+    pool.maintain()
+    warm = next(session for session in pool._sessions if session.user_key is None)
+
+    session = pool.acquire("alice")
+    assert session is not warm and backend.session_profiles[session.id] == "alice"
+    assert pool.stats["warm_hits"] == 0
+    pool.release(session)
+
+    # The warm session still serves throwaway tasks
+    assert pool.acquire(None) is warm
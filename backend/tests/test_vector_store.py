@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+from memory.vector_store import VectorStore
+
+
+def random_embeddings(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_append_and_search(tmp_path):
+    store = VectorStore(str(tmp_path))
+    embeddings = random_embeddings(20)
+    ids = store.add_batch([f"memory {i}" for i in range(20)], embeddings, [{"n": i} for i in range(20)])
+    assert ids == list(range(20)) and len(store) == 20
+    assert store.add("one more", random_embeddings(1, seed=1)[0]) == 20
+
+    record = store.get(7)
+    assert record["text"] == "memory 7" and record["metadata"] == {"n": 7}
+    assert store.search(embeddings[3], limit=1)[0][0] == 3
+    results = store.search(embeddings[3], limit=5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+    with pytest.raises(ValueError):
+        store.add("wrong dimension", np.ones(4))
+    with pytest.raises(IndexError):
+        store.get(21)
+    store.close()
+
+
+def test_appends_survive_reopen(tmp_path):
+    store = VectorStore(str(tmp_path))
+    embeddings = random_embeddings(10)
+    store.add_batch([f"memory {i}" for i in range(10)], embeddings)
+    store.close()
+
+    store = VectorStore(str(tmp_path))
+    assert len(store) == 10 and store.dim == 8
+    assert store.get(9)["text"] == "memory 9"
+    assert np.allclose(store.embeddings()[4], embeddings[4] / np.linalg.norm(embeddings[4]))
+    assert store.add("after reopen", embeddings[0]) == 10
+    assert store.get(10)["text"] == "after reopen"
+    store.close()
+
+
+def test_deleted_memories_are_never_returned(tmp_path):
+    store = VectorStore(str(tmp_path))
+    embeddings = random_embeddings(10)
+    store.add_batch([f"memory {i}" for i in range(10)], embeddings)
+    store.delete(3)
+    store.delete(3)
+    assert store.deleted_count == 1 and store.live_count == 9
+    assert 3 not in [i for i, _ in store.search(embeddings[3], limit=10)]
+    with pytest.raises(IndexError):
+        store.delete(10)
+    store.close()
+
+    store = VectorStore(str(tmp_path))
+    assert store.is_deleted(3) and store.deleted_count == 1
+    assert list(store.deleted_mask([2, 3])) == [False, True]
+    store.close()
+
+
+def test_interrupted_append_is_repaired_on_reopen(tmp_path):
+    store = VectorStore(str(tmp_path))
+    embeddings = random_embeddings(5)
+    store.add_batch([f"memory {i}" for i in range(5)], embeddings)
+    store.close()
+    sizes = {name: os.path.getsize(tmp_path / name) for name in ("records.jsonl", "embeddings.f32", "offsets.u64")}
+
+    # The process died after writing a record, part of its embedding, part of its offset and part of a tombstone
+    with open(tmp_path / "records.jsonl", "ab") as f:
+        f.write(b'{"id": 5, "text": "half written"}\n{"id": 6, "te')
+    with open(tmp_path / "embeddings.f32", "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())
+    with open(tmp_path / "offsets.u64", "ab") as f:
+        f.write(b"\x00" * 5)
+    with open(tmp_path / "tombstones.u64", "ab") as f:
+        f.write(b"\x01\x00")
+
+    store = VectorStore(str(tmp_path))
+    assert len(store) == 5 and store.deleted_count == 0
+    assert {name: os.path.getsize(tmp_path / name) for name in sizes} == sizes
+    assert os.path.getsize(tmp_path / "tombstones.u64") == 0
+    assert store.add("after the crash", embeddings[0]) == 5
+    assert store.get(5)["text"] == "after the crash"
+    assert store.get(4)["text"] == "memory 4"
+    assert store.search(embeddings[2], limit=1)[0][0] == 2
+    store.close()
@@ -51,16 +51,20 @@ export const Agent = ({ selectedActions, behaviorText }) => {
             setIsWaiting(false);
             setMessages(prev => {
                 const newMessages = [...prev];
-                if (newMessages.length > 0 && newMessages[newMessages.length - 1].type === 'agent') {
-                    newMessages[newMessages.length - 1] = {
-                        text: data.message,
-                        type: 'agent'
-                    };
+                // Later pieces of a reply replace the message it started; a new stream id is a new reply
+                let index = newMessages.length - 1;
+                while (index >= 0 && newMessages[index].streamId !== data.id) {
+                    index--;
+                }
+                const message = {
+                    text: data.message,
+                    type: 'agent',
+                    streamId: data.id
+                };
+                if (index !== -1) {
+                    newMessages[index] = message;
                 } else {
-                    newMessages.push({
-                        text: data.message,
-                        type: 'agent'
-                    });
+                    newMessages.push(message);
                 }
                 return newMessages;
             });